@@ -0,0 +1,105 @@
+import hashlib
+import time
+from typing import Optional
+from cachetools import TLRUCache, TTLCache
+from app.config import settings
+from app.db.users.models import UserPublic
+
+PRINCIPAL_CACHE_MAXSIZE = settings.principal_cache_maxsize
+PRINCIPAL_CACHE_TTL_SECONDS = settings.principal_cache_ttl_seconds
+TOKEN_CACHE_MAXSIZE = settings.token_cache_maxsize
+
+###################################################
+# Principal Cache
+###################################################
+
+class PrincipalCache:
+    """
+    Bounded TTL/LRU cache of UserPublic keyed by user_id.
+
+    Writes through this process are applied immediately; writes made by other
+    workers become visible once the entry's TTL runs out.
+    """
+
+    def __init__(self, maxsize: int = PRINCIPAL_CACHE_MAXSIZE, ttl: int = PRINCIPAL_CACHE_TTL_SECONDS):
+        self._cache: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: int) -> Optional[UserPublic]:
+        user = self._cache.get(user_id)
+        if user is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return user
+
+    def set(self, user: UserPublic) -> None:
+        self._cache[user.user_id] = user
+
+    def invalidate(self, user_id: int) -> None:
+        self._cache.pop(user_id, None)
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._cache),
+            "maxsize": self._cache.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+principal_cache = PrincipalCache()
+
+
+###################################################
+# Verified Token Cache
+###################################################
+
+def _token_expiry(key: bytes, claims: dict, now: float) -> float:
+    return claims.get("exp", now)
+
+class TokenCache:
+    """
+    Bounded cache of verified JWT claims keyed by a SHA-256 digest of the token.
+
+    Entries expire at the token's own exp claim, so a cached token is never
+    accepted past the point where jwt.decode would have rejected it.
+    """
+
+    def __init__(self, maxsize: int = TOKEN_CACHE_MAXSIZE):
+        self._cache: TLRUCache = TLRUCache(maxsize=maxsize, ttu=_token_expiry, timer=time.time)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> Optional[dict]:
+        claims = self._cache.get(self._key(token))
+        if claims is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return claims
+
+    def set(self, token: str, claims: dict) -> None:
+        self._cache[self._key(token)] = claims
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._cache),
+            "maxsize": self._cache.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+token_cache = TokenCache()
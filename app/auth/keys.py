@@ -0,0 +1,128 @@
+import time
+from pathlib import Path
+from typing import Dict, Optional
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+from jose import JWTError, jwk, jwt
+from app.config import settings
+from app.utils.metrics import JWT_SECONDS
+
+SECRET_KEY = settings.secret_key
+ALGORITHM = settings.algorithm
+
+# Directory of <kid>.pem private keys and <kid>.pub.pem retired public keys
+JWT_KEYS_DIR = settings.jwt_keys_dir
+JWT_ACTIVE_KID = settings.jwt_active_kid
+JWKS_MAX_AGE_SECONDS = settings.jwks_max_age_seconds
+JWT_ACCEPT_LEGACY_HS = settings.jwt_accept_legacy_hs
+
+###################################################
+# Signing Keys
+###################################################
+
+class SigningKey:
+    def __init__(self, kid: str, pem: str, algorithm: str, private: bool):
+        self.kid = kid
+        self.algorithm = algorithm
+        self.private = private
+        self.pem = pem
+        self.public_key = jwk.construct(pem, algorithm)
+        if private:
+            self.public_key = self.public_key.public_key()
+
+    def public_jwk(self) -> dict:
+        return {**self.public_key.to_dict(), "kid": self.kid, "use": "sig"}
+
+
+def _algorithm_for(key) -> str:
+    if isinstance(key, (rsa.RSAPrivateKey, rsa.RSAPublicKey)):
+        return "RS256"
+    if isinstance(key, (ec.EllipticCurvePrivateKey, ec.EllipticCurvePublicKey)):
+        return {"secp256r1": "ES256", "secp384r1": "ES384", "secp521r1": "ES512"}[key.curve.name]
+    raise ValueError(f"Unsupported signing key type: {type(key).__name__}")
+
+
+def load_signing_key(path: Path) -> SigningKey:
+    pem = path.read_text()
+    if path.name.endswith(".pub.pem"):
+        kid = path.name[:-len(".pub.pem")]
+        key = serialization.load_pem_public_key(pem.encode())
+        return SigningKey(kid, pem, _algorithm_for(key), private=False)
+    kid = path.name[:-len(".pem")]
+    key = serialization.load_pem_private_key(pem.encode(), password=None)
+    return SigningKey(kid, pem, _algorithm_for(key), private=True)
+
+
+class KeyRing:
+    """
+    Signs access tokens with the active asymmetric key and verifies them with any
+    key still in the ring, so old and new keys overlap during a rotation.
+
+    Without JWT_KEYS_DIR the ring signs with the shared SECRET_KEY/ALGORITHM.
+    Once it signs with an asymmetric key, tokens without a kid (signed with the
+    shared secret) are rejected unless accept_legacy_hs is set, so services that
+    still hold SECRET_KEY cannot mint tokens after the switch.
+    """
+
+    def __init__(self, keys_dir: Optional[str] = JWT_KEYS_DIR, active_kid: Optional[str] = JWT_ACTIVE_KID, accept_legacy_hs: bool = JWT_ACCEPT_LEGACY_HS):
+        self.keys_dir = keys_dir
+        self.active_kid = active_kid
+        self.accept_legacy_hs = accept_legacy_hs
+        self.keys: Dict[str, SigningKey] = {}
+        self.active: Optional[SigningKey] = None
+        self.reload()
+
+    def reload(self) -> None:
+        keys: Dict[str, SigningKey] = {}
+        if self.keys_dir:
+            for path in sorted(Path(self.keys_dir).glob("*.pem")):
+                key = load_signing_key(path)
+                keys[key.kid] = key
+
+        active = None
+        private_kids = sorted(kid for kid, key in keys.items() if key.private)
+        if self.active_kid:
+            active = keys.get(self.active_kid)
+            if active is None or not active.private:
+                raise ValueError(f"No private key found for JWT_ACTIVE_KID={self.active_kid}")
+        elif private_kids:
+            # Kids are expected to sort by age, e.g. 2024-06
+            active = keys[private_kids[-1]]
+
+        self.keys, self.active = keys, active
+
+    def sign(self, claims: dict) -> str:
+        started = time.perf_counter()
+        try:
+            if self.active is None:
+                return jwt.encode(claims, SECRET_KEY, algorithm=ALGORITHM)
+            return jwt.encode(claims, self.active.pem, algorithm=self.active.algorithm, headers={"kid": self.active.kid})
+        finally:
+            JWT_SECONDS.labels("encode").observe(time.perf_counter() - started)
+
+    def verify(self, token: str) -> dict:
+        started = time.perf_counter()
+        try:
+            return self._verify(token)
+        finally:
+            JWT_SECONDS.labels("decode").observe(time.perf_counter() - started)
+
+    def _verify(self, token: str) -> dict:
+        kid = jwt.get_unverified_header(token).get("kid")
+        if kid is None:
+            # Shared-secret tokens are only valid while the ring itself signs with the secret, or during an explicit switchover
+            if self.active is not None and not self.accept_legacy_hs:
+                raise JWTError("Token has no key id")
+            if not SECRET_KEY or not ALGORITHM:
+                raise JWTError("Token has no key id")
+            return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        key = self.keys.get(kid)
+        if key is None:
+            raise JWTError("Unknown key id")
+        return jwt.decode(token, key.public_key, algorithms=[key.algorithm])
+
+    def jwks(self) -> dict:
+        return {"keys": [key.public_jwk() for key in self.keys.values()]}
+
+
+key_ring = KeyRing()
@@ -1,33 +1,87 @@
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import Dict, Iterable, List, Optional
 from jose import JWTError, jwt
 from fastapi import Depends, HTTPException, status
-from app.schemas.token import TokenData
-from app.db.users.access import UsersRepository
+from app.schemas.token import IntrospectionResponse, Token, TokenData, TokenIntrospection, UserIntrospection
+from app.db.tokens.access import AsyncTokensRepository, utcnow
+from app.db.users.access import AsyncUsersRepository
 from app.db.users.models import User, UserPublic, UserUpdate
 from app.db.repositories import get_users_repository
-from app.auth.password import get_password_hash, oauth2_scheme, verify_password
-from dotenv import load_dotenv
+from app.auth.cache import principal_cache, token_cache
+from app.auth.keys import key_ring
+from app.auth.revocation import revocation_list
+from app.auth.password import ahash_password, averify_and_update_password, averify_password, oauth2_scheme
+from app.db.audit.models import LOGIN_FAILED, LOGIN_SUCCEEDED
+from app.utils.audit import record_event
+from app.utils.metrics import AUTH_FAILURES
+from app.config import settings
+import logging
 import os
+import uuid
 
-load_dotenv()
+SECRET_KEY = settings.secret_key
+ALGORITHM = settings.algorithm
 
-SECRET_KEY = os.getenv("SECRET_KEY")
-ALGORITHM = os.getenv("ALGORITHM")
+ACCESS_TOKEN_EXPIRE_MINUTES = settings.access_token_expire_minutes
+REFRESH_TOKEN_EXPIRE_DAYS = settings.refresh_token_expire_days
+ACCESS_TOKEN_LIFETIME = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+REFRESH_TOKEN_LIFETIME = timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
 
-def authenticate_user(username: str, password: str, users_repo: UsersRepository) -> Optional[UserPublic]:
-    user = users_repo.get_user_by_username(username)
-    if not user or not verify_password(password, user.hashed_password):
+logger = logging.getLogger(__name__)
+
+_dummy_password_hash: Optional[str] = None
+
+async def authenticate_user(username: str, password: str, users_repo: AsyncUsersRepository, client_ip: Optional[str] = None) -> Optional[UserPublic]:
+    global _dummy_password_hash
+    user = await users_repo.get_user_credentials(username)
+    if not user:
+        # Spend the same bcrypt time as a real check so unknown usernames cannot be told apart by latency
+        if _dummy_password_hash is None:
+            _dummy_password_hash = await ahash_password(os.urandom(16).hex())
+        await averify_password(password, _dummy_password_hash)
+        AUTH_FAILURES.labels("unknown_user").inc()
+        record_event(LOGIN_FAILED, username=username, ip=client_ip)
+        return None
+    verified, new_hash = await averify_and_update_password(password, user.hashed_password)
+    if not verified:
+        AUTH_FAILURES.labels("bad_password").inc()
+        record_event(LOGIN_FAILED, user_id=user.user_id, username=username, ip=client_ip)
         return None
+    if new_hash is not None:
+        # Stored hash uses an outdated cost; upgrade it while the plain password is at hand
+        await users_repo.update_password_hash(user.user_id, new_hash)
+    # Buffered: last_login_at and the failure count are written in the background
+    record_event(LOGIN_SUCCEEDED, user_id=user.user_id, ip=client_ip)
     return user
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
     expire = datetime.now(timezone.utc) + (expires_delta if expires_delta else timedelta(minutes=15))
     to_encode.update({"exp": expire})
-    token = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    to_encode.setdefault("jti", uuid.uuid4().hex)
+    token = key_ring.sign(to_encode)
     return token
 
+def user_claims(user: UserPublic) -> dict:
+    return {"user_id": user.user_id, "username": user.username, "email": user.email, "roles": user.roles}
+
+async def issue_tokens(user: UserPublic, tokens_repo: AsyncTokensRepository, family_id: Optional[str] = None) -> Token:
+    """Issues a short-lived access token plus a refresh token in a new or existing family."""
+    refresh_token, family_id = await tokens_repo.create_refresh_token(user.user_id, REFRESH_TOKEN_LIFETIME, family_id)
+    access_token = create_access_token(data={"user": user_claims(user), "fid": family_id}, expires_delta=ACCESS_TOKEN_LIFETIME)
+    return Token(
+        access_token=access_token,
+        token_type="bearer",
+        expires_in=int(ACCESS_TOKEN_LIFETIME.total_seconds()),
+        refresh_token=refresh_token,
+    )
+
+async def revoke_user_sessions(user_id: int, tokens_repo: AsyncTokensRepository) -> None:
+    family_ids = await tokens_repo.get_user_families(user_id)
+    await tokens_repo.revoke_families(family_ids, ACCESS_TOKEN_LIFETIME)
+    for family_id in family_ids:
+        revocation_list.add(family_id, utcnow() + ACCESS_TOKEN_LIFETIME)
+
 def create_reset_password_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
     expire = datetime.now(timezone.utc) + (expires_delta if expires_delta else timedelta(minutes=15))
@@ -35,44 +89,128 @@ def create_reset_password_token(data: dict, expires_delta: Optional[timedelta] =
     token = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return token
 
-async def get_current_user(token: str = Depends(oauth2_scheme), users_repo: UsersRepository = Depends(get_users_repository)) -> UserPublic:
+def decode_access_token(token: str) -> dict:
+    payload = token_cache.get(token)
+    if payload is None:
+        payload = key_ring.verify(token)
+        token_cache.set(token, payload)
+    return payload
+
+def _claims_user_id(claims: dict) -> Optional[int]:
+    user = claims.get("user")
+    return user.get("user_id") if isinstance(user, dict) else None
+
+async def resolve_users(user_ids: Iterable[int], users_repo: AsyncUsersRepository) -> Dict[int, UserPublic]:
+    users: Dict[int, UserPublic] = {}
+    missing = []
+    for user_id in set(user_ids):
+        user = principal_cache.get(user_id)
+        if user is None:
+            missing.append(user_id)
+        else:
+            users[user_id] = user
+    for user in (await users_repo.get_users_public(missing)).values():
+        principal_cache.set(user)
+        users[user.user_id] = user
+    return users
+
+async def introspect(tokens: List[str], user_ids: List[int], users_repo: AsyncUsersRepository) -> IntrospectionResponse:
+    """
+    Verifies a batch of access tokens and looks up a batch of user ids, resolving
+    every user involved with at most one query. A token is active when it verifies,
+    has not been revoked and its user still exists; roles come from the user record.
+    """
+    verified: List[Optional[dict]] = []
+    for token in tokens:
+        try:
+            claims = decode_access_token(token)
+        except JWTError:
+            claims = None
+        if claims is not None and (revocation_list.is_revoked(claims) or _claims_user_id(claims) is None):
+            claims = None
+        verified.append(claims)
+
+    users = await resolve_users(
+        [*user_ids, *(_claims_user_id(claims) for claims in verified if claims is not None)],
+        users_repo,
+    )
+
+    token_results = []
+    for claims in verified:
+        user = users.get(_claims_user_id(claims)) if claims is not None else None
+        if user is None:
+            token_results.append(TokenIntrospection(active=False))
+        else:
+            token_results.append(TokenIntrospection(active=True, claims=claims, roles=user.roles))
+    user_results = []
+    for user_id in user_ids:
+        user = users.get(user_id)
+        if user is None:
+            user_results.append(UserIntrospection(user_id=user_id, active=False))
+        else:
+            user_results.append(UserIntrospection(user_id=user_id, active=True, username=user.username, roles=user.roles))
+    return IntrospectionResponse(tokens=token_results, users=user_results)
+
+def verify_access_token(token: str) -> TokenData:
+    """Checks signature, expiry and revocation from the token alone; raises 401 otherwise."""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id = payload.get("user")["user_id"]
-        username: str = payload.get("user")["username"]
+        payload = decode_access_token(token)
+        if revocation_list.is_revoked(payload):
+            AUTH_FAILURES.labels("revoked_token").inc()
+            raise credentials_exception
+        # Signed but without a usable user claim: reject rather than fail on the lookup
+        user_id = _claims_user_id(payload)
+        username = payload["user"].get("username") if user_id is not None else None
         if user_id is None or username is None:
+            AUTH_FAILURES.labels("malformed_token").inc()
             raise credentials_exception
-        token_data = TokenData(user_id=user_id, username=username)
+        return TokenData(user_id=user_id, username=username, roles=payload["user"].get("roles"), family_id=payload.get("fid"))
     except JWTError as error:
-        print("JWT Error", error)
+        AUTH_FAILURES.labels("invalid_token").inc()
+        logger.info("Rejected access token", extra={"reason": str(error)})
         raise credentials_exception
 
-    print("Token Data", token_data)
-    user = users_repo.get_user_public(token_data.user_id)
+async def get_current_user(token: str = Depends(oauth2_scheme), users_repo: AsyncUsersRepository = Depends(get_users_repository)) -> UserPublic:
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    token_data = verify_access_token(token)
+
+    user = principal_cache.get(token_data.user_id)
+    if user is not None:
+        return user
+
+    user = await users_repo.get_user_public(token_data.user_id)
     if user is None:
+        AUTH_FAILURES.labels("user_not_found").inc()
+        logger.info("Access token for missing user", extra={"user_id": token_data.user_id})
         raise credentials_exception
+    principal_cache.set(user)
     return user
 
-def update_user(user_id: int, email: str, username: str, password: str, users_repo: UsersRepository) -> Optional[str]:
+async def update_user(user_id: int, email: str, username: str, password: str, users_repo: AsyncUsersRepository, tokens_repo: AsyncTokensRepository, family_id: Optional[str]) -> Optional[str]:
     update_user = UserUpdate(email=email, username=username, password=password)
-    user = users_repo.update_user(user_id, update_user)
+    user = await users_repo.update_user(user_id, update_user)
 
     if user is None:
         return None
 
-    access_token_expires = timedelta(days=1)
-    access_token = create_access_token(
-        data={"user": {"user_id": user.user_id, "username": user.username, "email": user.email, "roles": user.roles}}, expires_delta=access_token_expires
-    )
+    # Revocation works per session family, so the new token stays in the caller's
+    if family_id is None:
+        # The caller's token predates session families; open one so this token can still be revoked
+        _, family_id = await tokens_repo.create_refresh_token(user.user_id, REFRESH_TOKEN_LIFETIME)
+    access_token = create_access_token(data={"user": user_claims(user), "fid": family_id}, expires_delta=ACCESS_TOKEN_LIFETIME)
 
     return access_token
 
-def update_user_password(user_id:int, password: str, users_repo: UsersRepository) -> Optional[UserPublic]:
+async def update_user_password(user_id:int, password: str, users_repo: AsyncUsersRepository) -> Optional[UserPublic]:
     user_update = UserUpdate(password=password)
-    update_result = users_repo.update_user(user_id, user_update)
+    update_result = await users_repo.update_user(user_id, user_update)
     return update_result
@@ -1,12 +1,192 @@
+import asyncio
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple
 from fastapi.security import OAuth2PasswordBearer
 from passlib.context import CryptContext
+from app.config import settings
+from app.utils.metrics import PASSWORD_HASH_IN_FLIGHT, PASSWORD_HASH_SECONDS
 
+PASSWORD_HASH_EXECUTOR = settings.password_hash_executor
+PASSWORD_HASH_WORKERS = settings.password_hash_workers
+PASSWORD_HASH_BULK_WORKERS = settings.password_hash_bulk_workers or max(1, PASSWORD_HASH_WORKERS // 2)
+# Passwords per bulk task; bounds how long one task keeps a pool worker from logins
+HASH_MANY_CHUNK_SIZE = 8
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Fixed bcrypt work factor; when unset and BCRYPT_TARGET_MS is set, it is calibrated at startup
+BCRYPT_ROUNDS = settings.bcrypt_rounds or None
+BCRYPT_DEFAULT_ROUNDS = 12
+BCRYPT_TARGET_MS = settings.bcrypt_target_ms or None
+BCRYPT_MIN_ROUNDS = settings.bcrypt_min_rounds
+BCRYPT_MAX_ROUNDS = settings.bcrypt_max_rounds
+
+def build_password_context(rounds: int) -> CryptContext:
+    # Hashes made with any other cost are reported by needs_update/verify_and_update
+    return CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=rounds)
+
+pwd_context = build_password_context(BCRYPT_ROUNDS or BCRYPT_DEFAULT_ROUNDS)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+def configure_password_context(rounds: int) -> None:
+    global pwd_context
+    pwd_context = build_password_context(rounds)
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
+def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
+
+def get_password_hashes(passwords: List[str]) -> List[str]:
+    return [pwd_context.hash(password) for password in passwords]
+
+def calibrate_rounds(target_ms: float, min_rounds: int = BCRYPT_MIN_ROUNDS, max_rounds: int = BCRYPT_MAX_ROUNDS) -> int:
+    """Picks the highest bcrypt cost whose verify time stays within target_ms on this machine."""
+    sample = build_password_context(min_rounds).hash("calibration")
+    started = time.perf_counter()
+    build_password_context(min_rounds).verify("calibration", sample)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    rounds = min_rounds
+    # Each extra round doubles the work
+    while rounds < max_rounds and elapsed_ms * 2 <= target_ms:
+        rounds += 1
+        elapsed_ms *= 2
+    return rounds
+
+###################################################
+# Async Password Hasher
+###################################################
+
+class PasswordHasher:
+    """
+    Runs bcrypt work in a bounded worker pool so it never blocks the event loop.
+
+    bcrypt releases the GIL while hashing, so the default thread pool scales
+    across cores; a process pool is available for hosts where it does not.
+
+    Bulk hashing feeds the pool small chunks, at most bulk_workers at a time
+    across all callers, so a large import never queues ahead of logins.
+    """
+
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, executor: str = PASSWORD_HASH_EXECUTOR, rounds: int = BCRYPT_ROUNDS or BCRYPT_DEFAULT_ROUNDS, bulk_workers: int = PASSWORD_HASH_BULK_WORKERS):
+        self.workers = max(1, workers)
+        self.executor_kind = executor
+        self.rounds = rounds
+        self.bulk_workers = max(1, bulk_workers)
+        self._bulk_slots = asyncio.Semaphore(self.bulk_workers)
+        self._executor: Optional[Executor] = None
+        self.in_flight = 0
+        self.completed = 0
+        self.total_wait_seconds = 0.0
+        self.total_run_seconds = 0.0
+        self.max_run_seconds = 0.0
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.executor_kind == "process":
+                # Worker processes build their own context, so hand them the current cost
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=configure_password_context, initargs=(self.rounds,))
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        return self._executor
+
+    async def _run(self, operation: str, func: Callable, *args):
+        loop = asyncio.get_running_loop()
+        submitted = time.perf_counter()
+        self.in_flight += 1
+        PASSWORD_HASH_IN_FLIGHT.inc()
+        try:
+            started, result = await loop.run_in_executor(self._get_executor(), _timed_call, func, *args)
+        finally:
+            self.in_flight -= 1
+            PASSWORD_HASH_IN_FLIGHT.dec()
+        finished = time.perf_counter()
+        PASSWORD_HASH_SECONDS.labels(operation).observe(finished - submitted)
+        # perf_counter is system-wide, so worker processes report comparable timestamps
+        run_seconds = finished - started
+        self.completed += 1
+        self.total_wait_seconds += max(0.0, started - submitted)
+        self.total_run_seconds += run_seconds
+        self.max_run_seconds = max(self.max_run_seconds, run_seconds)
+        return result
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run("verify", verify_password, plain_password, hashed_password)
+
+    async def verify_and_update(self, plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        return await self._run("verify", verify_and_update_password, plain_password, hashed_password)
+
+    async def hash(self, password: str) -> str:
+        return await self._run("hash", get_password_hash, password)
+
+    async def hash_many(self, passwords: List[str]) -> List[str]:
+        async def hash_chunk(chunk: List[str]) -> List[str]:
+            # Waiting here rather than in the pool's FIFO queue lets logins overtake the import
+            async with self._bulk_slots:
+                return await self._run("hash_many", get_password_hashes, chunk)
+
+        chunks = [passwords[i:i + HASH_MANY_CHUNK_SIZE] for i in range(0, len(passwords), HASH_MANY_CHUNK_SIZE)]
+        results = await asyncio.gather(*(hash_chunk(chunk) for chunk in chunks))
+        return [hashed for chunk in results for hashed in chunk]
+
+    def configure(self, workers: Optional[int] = None, executor: Optional[str] = None, rounds: Optional[int] = None, bulk_workers: Optional[int] = None) -> None:
+        self.shutdown()
+        if workers is not None:
+            self.workers = max(1, workers)
+        if bulk_workers is not None:
+            self.bulk_workers = max(1, bulk_workers)
+            self._bulk_slots = asyncio.Semaphore(self.bulk_workers)
+        if executor is not None:
+            self.executor_kind = executor
+        if rounds is not None:
+            self.rounds = rounds
+            configure_password_context(rounds)
+
+    async def calibrate(self, target_ms: float) -> int:
+        # Measured on a pool worker, where real hashing happens
+        rounds = await self._run("calibrate", calibrate_rounds, target_ms)
+        self.configure(rounds=rounds)
+        return rounds
+
+    def stats(self) -> dict:
+        completed = self.completed or 1
+        return {
+            "executor": self.executor_kind,
+            "workers": self.workers,
+            "bulk_workers": self.bulk_workers,
+            "rounds": self.rounds,
+            "in_flight": self.in_flight,
+            "queue_depth": max(0, self.in_flight - self.workers),
+            "completed": self.completed,
+            "avg_wait_ms": self.total_wait_seconds / completed * 1000,
+            "avg_run_ms": self.total_run_seconds / completed * 1000,
+            "max_run_ms": self.max_run_seconds * 1000,
+        }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+def _timed_call(func: Callable, *args):
+    started = time.perf_counter()
+    return started, func(*args)
+
+
+password_hasher = PasswordHasher()
+
+async def averify_password(plain_password: str, hashed_password: str) -> bool:
+    return await password_hasher.verify(plain_password, hashed_password)
+
+async def averify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    return await password_hasher.verify_and_update(plain_password, hashed_password)
+
+async def ahash_password(password: str) -> str:
+    return await password_hasher.hash(password)
+
+async def ahash_passwords(passwords: List[str]) -> List[str]:
+    return await password_hasher.hash_many(passwords)
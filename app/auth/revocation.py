@@ -0,0 +1,88 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+from app.config import settings
+from app.db.config import AsyncSessionLocal
+from app.db.tokens.access import AsyncTokensRepository, utcnow
+
+REVOCATION_REFRESH_SECONDS = settings.revocation_refresh_seconds
+# New rows are found by id; rows created this far back are re-read too, for transactions that committed late
+REVOCATION_OVERLAP_SECONDS = settings.revocation_overlap_seconds
+TOKEN_PURGE_INTERVAL_SECONDS = settings.token_purge_interval_seconds
+
+logger = logging.getLogger(__name__)
+
+###################################################
+# Revocation List
+###################################################
+
+class RevocationList:
+    """
+    In-memory set of revoked access-token jtis and refresh-token family ids.
+
+    Lookups are a dict membership test. The set is kept current by polling
+    token_revocations for rows with a higher id than any seen so far, and
+    entries are dropped once every token they could match has expired.
+    """
+
+    def __init__(self, refresh_seconds: float = REVOCATION_REFRESH_SECONDS, overlap_seconds: float = REVOCATION_OVERLAP_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self.overlap = timedelta(seconds=overlap_seconds)
+        self._revoked: Dict[str, datetime] = {}
+        self._last_id: Optional[int] = None
+        self._last_refresh: Optional[datetime] = None
+        self._last_purge = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def is_revoked(self, claims: dict) -> bool:
+        return claims.get("jti") in self._revoked or claims.get("fid") in self._revoked
+
+    def add(self, jti: str, expires_at: datetime) -> None:
+        self._revoked[jti] = expires_at
+
+    def prune(self) -> None:
+        now = utcnow()
+        self._revoked = {jti: expires_at for jti, expires_at in self._revoked.items() if expires_at > now}
+
+    async def refresh(self) -> None:
+        started = utcnow()
+        since = self._last_refresh - self.overlap if self._last_refresh is not None else None
+        async with AsyncSessionLocal() as db:
+            tokens_repo = AsyncTokensRepository(db)
+            for row_id, jti, expires_at in await tokens_repo.get_revocations_after(self._last_id, since):
+                self._revoked[jti] = expires_at
+                self._last_id = max(row_id, self._last_id or 0)
+            if time.monotonic() - self._last_purge >= TOKEN_PURGE_INTERVAL_SECONDS:
+                await tokens_repo.purge_expired()
+                self._last_purge = time.monotonic()
+        self._last_refresh = started
+        self.prune()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.refresh_seconds)
+            try:
+                await self.refresh()
+            except Exception:
+                logger.exception("Refreshing the token revocation list failed")
+
+    async def start(self) -> None:
+        try:
+            await self.refresh()
+        except Exception:
+            logger.exception("Loading the token revocation list failed; retrying in the background")
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def __len__(self) -> int:
+        return len(self._revoked)
+
+
+revocation_list = RevocationList()
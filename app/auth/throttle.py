@@ -0,0 +1,111 @@
+import time
+import uuid
+from collections import deque
+from typing import Optional
+from cachetools import TTLCache
+from app.config import settings
+
+LOGIN_MAX_ATTEMPTS_PER_USERNAME = settings.login_max_attempts_per_username
+LOGIN_MAX_ATTEMPTS_PER_IP = settings.login_max_attempts_per_ip
+LOGIN_THROTTLE_WINDOW_SECONDS = settings.login_throttle_window_seconds
+LOGIN_THROTTLE_MAX_KEYS = settings.login_throttle_max_keys
+# "memory" keeps counters per worker, "redis" shares them between workers
+LOGIN_THROTTLE_BACKEND = settings.login_throttle_backend
+LOGIN_THROTTLE_REDIS_URL = settings.login_throttle_redis_url
+
+###################################################
+# Backends
+###################################################
+
+class InMemoryThrottleBackend:
+    """Sliding-window counters for a single worker, bounded to max_keys keys."""
+
+    def __init__(self, window: int = LOGIN_THROTTLE_WINDOW_SECONDS, max_keys: int = LOGIN_THROTTLE_MAX_KEYS):
+        self.window = window
+        # Keys idle for a whole window have nothing left to count and can be evicted
+        self._hits: TTLCache = TTLCache(maxsize=max_keys, ttl=window)
+
+    async def hit(self, key: str, limit: int) -> Optional[float]:
+        now = time.monotonic()
+        hits = self._hits.get(key)
+        if hits is None:
+            hits = deque()
+        while hits and hits[0] <= now - self.window:
+            hits.popleft()
+        if len(hits) >= limit:
+            return hits[0] + self.window - now
+        hits.append(now)
+        self._hits[key] = hits
+        return None
+
+    async def reset(self, key: str) -> None:
+        self._hits.pop(key, None)
+
+
+class RedisThrottleBackend:
+    """Sliding-window counters in Redis sorted sets, shared by every worker."""
+
+    def __init__(self, url: str = LOGIN_THROTTLE_REDIS_URL, window: int = LOGIN_THROTTLE_WINDOW_SECONDS):
+        try:
+            import redis.asyncio as redis
+        except ImportError as error:
+            raise RuntimeError("LOGIN_THROTTLE_BACKEND=redis requires the 'redis' package") from error
+        self.window = window
+        self._redis = redis.from_url(url)
+
+    async def hit(self, key: str, limit: int) -> Optional[float]:
+        now = time.time()
+        redis_key = f"login-throttle:{key}"
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.zremrangebyscore(redis_key, 0, now - self.window)
+            pipe.zrange(redis_key, 0, 0, withscores=True)
+            pipe.zcard(redis_key)
+            _, oldest, count = await pipe.execute()
+        if count >= limit:
+            return oldest[0][1] + self.window - now
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.zadd(redis_key, {uuid.uuid4().hex: now})
+            pipe.expire(redis_key, self.window)
+            await pipe.execute()
+        return None
+
+    async def reset(self, key: str) -> None:
+        await self._redis.delete(f"login-throttle:{key}")
+
+
+def build_backend(kind: str = LOGIN_THROTTLE_BACKEND):
+    if kind == "redis":
+        return RedisThrottleBackend()
+    return InMemoryThrottleBackend()
+
+###################################################
+# Login Throttle
+###################################################
+
+class LoginThrottle:
+    def __init__(
+        self,
+        backend=None,
+        max_per_username: int = LOGIN_MAX_ATTEMPTS_PER_USERNAME,
+        max_per_ip: int = LOGIN_MAX_ATTEMPTS_PER_IP,
+    ):
+        self.backend = backend if backend is not None else build_backend()
+        self.max_per_username = max_per_username
+        self.max_per_ip = max_per_ip
+        self.throttled = 0
+
+    async def hit(self, username: str, client_ip: Optional[str]) -> Optional[int]:
+        """Records a login attempt; returns the seconds to wait when it is over the limit."""
+        retry_after = await self.backend.hit(f"user:{username.lower()}", self.max_per_username)
+        if retry_after is None and client_ip:
+            retry_after = await self.backend.hit(f"ip:{client_ip}", self.max_per_ip)
+        if retry_after is None:
+            return None
+        self.throttled += 1
+        return max(1, int(retry_after + 0.999))
+
+    async def reset(self, username: str) -> None:
+        await self.backend.reset(f"user:{username.lower()}")
+
+
+login_throttle = LoginThrottle()
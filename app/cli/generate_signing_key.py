@@ -0,0 +1,45 @@
+"""
+Generate a new access-token signing key in JWT_KEYS_DIR.
+
+    python -m app.cli.generate_signing_key 2024-06 --type rsa
+
+Rotate by generating a key with a later kid, deploying it alongside the old
+one, and once tokens signed with the old key have expired, replacing the old
+<kid>.pem with its public half (--retire) and eventually deleting it.
+"""
+import argparse
+from pathlib import Path
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+from app.auth.keys import JWT_KEYS_DIR
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Generate or retire an access-token signing key.")
+    parser.add_argument("kid", help="key id, e.g. 2024-06; the newest kid signs unless JWT_ACTIVE_KID is set")
+    parser.add_argument("--type", choices=["rsa", "ec"], default="rsa", help="RS256 (rsa) or ES256 (ec)")
+    parser.add_argument("--dir", default=JWT_KEYS_DIR, required=JWT_KEYS_DIR is None, help="keys directory")
+    parser.add_argument("--retire", action="store_true", help="keep only the public half of an existing key")
+    args = parser.parse_args()
+
+    keys_dir = Path(args.dir)
+    private_path = keys_dir / f"{args.kid}.pem"
+
+    if args.retire:
+        key = serialization.load_pem_private_key(private_path.read_bytes(), password=None)
+        public_pem = key.public_key().public_bytes(serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo)
+        (keys_dir / f"{args.kid}.pub.pem").write_bytes(public_pem)
+        private_path.unlink()
+        return
+
+    if args.type == "rsa":
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    else:
+        key = ec.generate_private_key(ec.SECP256R1())
+    keys_dir.mkdir(parents=True, exist_ok=True)
+    private_path.write_bytes(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()))
+    private_path.chmod(0o600)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Bulk-import users from a CSV (email,username,password header) or JSON Lines file.
+
+    python -m app.cli.import_users users.csv --batch-size 1000 --workers 8
+"""
+import argparse
+import asyncio
+import csv
+import json
+import os
+import sys
+from typing import List
+from app.auth.password import password_hasher
+from app.db.config import AsyncSessionLocal, dispose_engine, init_engine
+from app.db.users.access import AsyncUsersRepository
+from app.db.users.models import UserCreate
+
+
+def read_users(path: str) -> List[UserCreate]:
+    with open(path, newline="") as file:
+        if path.endswith((".jsonl", ".ndjson")):
+            return [UserCreate(**json.loads(line)) for line in file if line.strip()]
+        return [UserCreate(**row) for row in csv.DictReader(file)]
+
+
+async def import_users(path: str, batch_size: int) -> int:
+    users = read_users(path)
+    init_engine()
+    async with AsyncSessionLocal() as db:
+        result = await AsyncUsersRepository(db).create_users(users, batch_size=batch_size)
+    await dispose_engine()
+
+    for error in result.errors:
+        print(error.model_dump_json(), file=sys.stderr)
+    print(json.dumps({"total": len(users), "created": len(result.created), "errors": len(result.errors)}))
+    return 1 if result.errors else 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Bulk-import users into the users table.")
+    parser.add_argument("path", help="CSV or JSON Lines file with email, username and password fields")
+    parser.add_argument("--batch-size", type=int, default=1000, help="rows per INSERT statement")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="password hashing processes")
+    args = parser.parse_args()
+
+    # Hash in separate processes so the import uses every core; there are no logins to leave room for
+    password_hasher.configure(workers=args.workers, executor="process", bulk_workers=args.workers)
+    try:
+        sys.exit(asyncio.run(import_users(args.path, args.batch_size)))
+    finally:
+        password_hasher.shutdown()
+
+
+if __name__ == "__main__":
+    main()
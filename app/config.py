@@ -0,0 +1,177 @@
+import os
+from typing import List, Optional
+from pydantic import Field
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class Settings(BaseSettings):
+    """
+    Every setting the service reads, loaded once from the environment and .env.
+
+    Names match the environment variables case-insensitively; see .env.sample.
+    Empty values (e.g. an unfilled `PASSWORD_HASH_WORKERS=`) fall back to the default.
+    """
+
+    model_config = SettingsConfigDict(env_file=".env", env_ignore_empty=True, extra="ignore")
+
+    ###################################################
+    # Observability
+    ###################################################
+
+    log_level: str = "INFO"
+    # "json" for structured logs, "text" for human-readable local output
+    log_format: str = "json"
+    prometheus_multiproc_dir: Optional[str] = None
+
+    ###################################################
+    # Database
+    ###################################################
+
+    db_host: Optional[str] = None
+    db_name: Optional[str] = None
+    db_user: Optional[str] = None
+    db_password: Optional[str] = None
+    db_port: Optional[str] = None
+    # Overrides the DB_* settings, e.g. sqlite+aiosqlite:///./local.db for local runs
+    database_url: Optional[str] = None
+    # Comma-separated read replica URLs; reads are spread over them, writes always go to the primary
+    database_replica_urls: Optional[str] = None
+    # How long reads for a user stay on the primary after a write to that user
+    replica_sticky_seconds: float = 5
+    replica_sticky_max_keys: int = 100000
+
+    # Per engine and per worker: a worker opens at most pool_size + max_overflow connections to each database
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout_seconds: float = 30
+    db_pool_recycle_seconds: int = 1800
+    db_pool_pre_ping: bool = False
+    # Server-side statement_timeout for every connection (Postgres only)
+    db_statement_timeout_ms: Optional[int] = None
+    # PgBouncer in transaction mode: no server-side prepared statement caching and no startup settings
+    db_pgbouncer: bool = False
+    health_db_timeout_seconds: float = 2
+
+    ###################################################
+    # JWT
+    ###################################################
+
+    secret_key: Optional[str] = None
+    algorithm: Optional[str] = None
+    access_token_expire_minutes: int = 15
+    refresh_token_expire_days: int = 30
+    jwt_keys_dir: Optional[str] = None
+    jwt_active_kid: Optional[str] = None
+    jwks_max_age_seconds: int = 3600
+    # Keep accepting SECRET_KEY-signed tokens after switching to JWT_KEYS_DIR; only for the switchover
+    jwt_accept_legacy_hs: bool = False
+
+    revocation_refresh_seconds: float = 5
+    revocation_overlap_seconds: float = 60
+    token_purge_interval_seconds: float = 3600
+
+    login_max_attempts_per_username: int = 5
+    login_max_attempts_per_ip: int = 20
+    login_throttle_window_seconds: int = 60
+    login_throttle_max_keys: int = 100000
+    login_throttle_backend: str = "memory"
+    login_throttle_redis_url: str = "redis://localhost:6379/0"
+
+    # Tokens plus user ids accepted by one POST /token/introspect call
+    introspection_max_items: int = 1000
+
+    principal_cache_maxsize: int = 10000
+    principal_cache_ttl_seconds: int = 60
+    token_cache_maxsize: int = 10000
+
+    ###################################################
+    # Password Hashing
+    ###################################################
+
+    password_hash_executor: str = "thread"
+    password_hash_workers: int = Field(default_factory=lambda: os.cpu_count() or 1)
+    # Pool workers bulk hashing may occupy at once, so logins keep the rest; defaults to half the workers
+    password_hash_bulk_workers: Optional[int] = None
+    bcrypt_rounds: Optional[int] = None
+    bcrypt_target_ms: Optional[float] = None
+    bcrypt_min_rounds: int = 10
+    bcrypt_max_rounds: int = 16
+
+    ###################################################
+    # Admission Control
+    ###################################################
+
+    # Concurrent bcrypt-heavy requests per worker; defaults to twice the password hash workers
+    admission_max_concurrent: Optional[int] = None
+    admission_max_queue: int = 64
+    admission_queue_timeout_seconds: float = 5
+    admission_retry_after_seconds: int = 1
+
+    ###################################################
+    # Audit
+    ###################################################
+
+    # Events are written when this many are buffered or every flush interval, whichever comes first
+    audit_batch_size: int = 500
+    audit_flush_interval_seconds: float = 1
+    # Events held per worker while the database is slow or down; newer events are dropped beyond it
+    audit_max_buffer: int = 10000
+
+    ###################################################
+    # Profiling
+    ###################################################
+
+    # Requests to profile at random, e.g. 0.001; 0 leaves only requests sending X-Profile-Token
+    profiling_sample_rate: float = 0
+    # Secret a request sends in X-Profile-Token to be profiled; profiling is off when unset and the sample rate is 0
+    profiling_token: Optional[str] = None
+    profiling_dir: str = "profiles"
+    profiling_max_files: int = 200
+
+    ###################################################
+    # Users
+    ###################################################
+
+    users_page_max_limit: int = 1000
+    users_export_batch_size: int = 1000
+    # Rows per POST /api/v1/users/bulk; larger imports go through app/cli/import_users.py
+    users_bulk_max_rows: int = 1000
+    users_bulk_batch_size: int = 1000
+
+    ###################################################
+    # Email
+    ###################################################
+
+    ses_sender: Optional[str] = None
+    ses_region: str = "sa-east-1"
+    test_ses_recipient: Optional[str] = None
+    email_transport: str = "ses"
+    email_outbox_dir: str = "outbox"
+    email_queue_size: int = 1000
+    email_concurrency: int = 4
+    email_max_retries: int = 3
+    email_retry_backoff_seconds: float = 0.5
+
+    ###################################################
+    # Reset Password
+    ###################################################
+
+    reset_password_secret_key: Optional[str] = None
+    reset_password_secret_key_algorithm: Optional[str] = None
+    reset_password_token_expire_minutes: int = 15
+    frontend_reset_password_url: Optional[str] = None
+
+    @property
+    def database_dsn(self) -> str:
+        return self.database_url or f"postgresql+asyncpg://{self.db_user}:{self.db_password}@{self.db_host}:{self.db_port}/{self.db_name}"
+
+    @property
+    def replica_dsns(self) -> List[str]:
+        return [url.strip() for url in (self.database_replica_urls or "").split(",") if url.strip()]
+
+
+settings = Settings()
+
+# prometheus_client reads this straight from the process environment
+if settings.prometheus_multiproc_dir:
+    os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", settings.prometheus_multiproc_dir)
@@ -0,0 +1,64 @@
+from dataclasses import asdict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import bindparam, insert, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.audit.models import LOGIN_FAILED, LOGIN_SUCCEEDED, AuditEvent, AuditEventCreate
+from app.db.users.models import User
+from app.utils.metrics import REPOSITORY_QUERY_SECONDS, timed
+
+_users = User.__table__
+
+# Core rather than ORM bulk insert, which groups rows by their non-null columns into separate statements
+_INSERT_EVENTS = insert(AuditEvent.__table__)
+
+# Core statements run as executemany: one round trip for every user in a batch
+_RECORD_LOGIN = (
+    update(_users)
+    .where(_users.c.user_id == bindparam("uid"))
+    .values(last_login_at=bindparam("at"), failed_login_count=bindparam("failed"))
+)
+_RECORD_FAILED_LOGINS = (
+    update(_users)
+    .where(_users.c.user_id == bindparam("uid"))
+    .values(failed_login_count=_users.c.failed_login_count + bindparam("failed"))
+)
+
+###################################################
+# Audit Repository Class
+###################################################
+
+class AsyncAuditRepository:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    @timed(REPOSITORY_QUERY_SECONDS, "write_audit_events")
+    async def write_events(self, events: List[AuditEventCreate]) -> None:
+        """
+        Inserts a batch of events and folds its logins into users.last_login_at
+        and users.failed_login_count (failures since the last success), in one
+        transaction.
+        """
+        # user_id -> (last successful login in the batch, failures after it)
+        logins: Dict[int, Tuple[Optional[datetime], int]] = {}
+        for event in events:
+            if event.user_id is None:
+                continue
+            if event.event == LOGIN_SUCCEEDED:
+                logins[event.user_id] = (event.created_at, 0)
+            elif event.event == LOGIN_FAILED:
+                last_login, failed = logins.get(event.user_id, (None, 0))
+                logins[event.user_id] = (last_login, failed + 1)
+
+        succeeded = [{"uid": user_id, "at": at, "failed": failed} for user_id, (at, failed) in logins.items() if at is not None]
+        failed_only = [{"uid": user_id, "failed": failed} for user_id, (at, failed) in logins.items() if at is None]
+        try:
+            await self.db.execute(_INSERT_EVENTS, [asdict(event) for event in events])
+            if succeeded:
+                await self.db.execute(_RECORD_LOGIN, succeeded)
+            if failed_only:
+                await self.db.execute(_RECORD_FAILED_LOGINS, failed_only)
+            await self.db.commit()
+        except BaseException:
+            await self.db.rollback()
+            raise
@@ -0,0 +1,45 @@
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import BigInteger, Column, Index, Integer, String, TIMESTAMP
+from app.db.config import Base
+
+LOGIN_SUCCEEDED = "login_succeeded"
+LOGIN_FAILED = "login_failed"
+USER_UPDATED = "user_updated"
+USER_DELETED = "user_deleted"
+PASSWORD_RESET = "password_reset"
+
+
+###################################################
+# SQLAlchemy Model
+###################################################
+
+class AuditEvent(Base):
+    __tablename__ = 'audit_events'
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    event = Column(String(32), nullable=False)
+    # No foreign keys: the trail outlives deleted users
+    user_id = Column(Integer, nullable=True)
+    actor_id = Column(Integer, nullable=True)
+    # The username tried, for failed logins that matched no user
+    username = Column(String, nullable=True)
+    ip = Column(String(45), nullable=True)
+    created_at = Column(TIMESTAMP, nullable=False, index=True)
+
+    __table_args__ = (
+        Index("ix_audit_events_user_id_created_at", user_id, created_at),
+    )
+
+###################################################
+# Buffered Event
+###################################################
+
+@dataclass
+class AuditEventCreate:
+    event: str
+    created_at: datetime
+    user_id: Optional[int] = None
+    actor_id: Optional[int] = None
+    username: Optional[str] = None
+    ip: Optional[str] = None
@@ -1,28 +1,147 @@
-from sqlalchemy import create_engine
+import itertools
+import time
+import uuid
+from typing import List, Optional
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-import os
-from dotenv import load_dotenv
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from app.config import settings
+from app.utils.metrics import DB_POOL_CHECKOUT_SECONDS, DB_POOL_IDLE, DB_POOL_IN_USE, DB_POOL_TIMEOUTS
 
-load_dotenv()
+# Built on first use, normally by the app's lifespan hook, so importing the app stays cheap
+engine: Optional[AsyncEngine] = None
+replica_engines: List[AsyncEngine] = []
+_replica_cycle = None
+# Keep loaded attributes usable after commit; lazy refreshes are not possible under asyncio
+AsyncSessionLocal = async_sessionmaker(autoflush=False, expire_on_commit=False)
 
-DB_HOST = os.getenv('DB_HOST')
-DB_NAME = os.getenv('DB_NAME')
-DB_USER = os.getenv('DB_USER')
-DB_PASSWORD = os.getenv('DB_PASSWORD')
-DB_PORT = os.getenv('DB_PORT')
+Base = declarative_base()
 
-connection_string = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+###################################################
+# Connection Pools
+###################################################
 
-engine = create_engine(connection_string)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that reports checkout waits and in-use/idle connections per pool label."""
 
-Base = declarative_base()
+    pool_label = "primary"
+
+    def recreate(self) -> "InstrumentedQueuePool":
+        pool = super().recreate()
+        pool.pool_label = self.pool_label
+        return pool
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            record = super()._do_get()
+        except PoolTimeoutError:
+            DB_POOL_TIMEOUTS.labels(self.pool_label).inc()
+            raise
+        finally:
+            DB_POOL_CHECKOUT_SECONDS.labels(self.pool_label).observe(time.perf_counter() - started)
+        self._report_usage()
+        return record
+
+    def _do_return_conn(self, record) -> None:
+        super()._do_return_conn(record)
+        self._report_usage()
+
+    def _report_usage(self) -> None:
+        DB_POOL_IN_USE.labels(self.pool_label).set(self.checkedout())
+        DB_POOL_IDLE.labels(self.pool_label).set(self.checkedin())
+
+
+def build_engine(dsn: str, pool_label: str) -> AsyncEngine:
+    url = make_url(dsn)
+    options = {}
+    connect_args = {}
+    if url.get_backend_name() != "sqlite" or url.database not in (None, "", ":memory:"):
+        # In-memory SQLite needs its single shared connection; everything else gets the tuned pool
+        options.update(
+            poolclass=InstrumentedQueuePool,
+            pool_size=settings.db_pool_size,
+            max_overflow=settings.db_max_overflow,
+            pool_timeout=settings.db_pool_timeout_seconds,
+            pool_recycle=settings.db_pool_recycle_seconds,
+            pool_pre_ping=settings.db_pool_pre_ping,
+        )
+    if url.get_backend_name() == "postgresql":
+        if settings.db_pgbouncer:
+            # Transaction pooling hands each transaction to any server connection, so named
+            # prepared statements must be unique and never reused, and startup settings are not forwarded
+            connect_args.update(
+                statement_cache_size=0,
+                prepared_statement_cache_size=0,
+                prepared_statement_name_func=lambda: f"__asyncpg_{uuid.uuid4()}__",
+            )
+            if settings.db_statement_timeout_ms:
+                # Client-side backstop; set statement_timeout on the database role as well
+                connect_args["command_timeout"] = settings.db_statement_timeout_ms / 1000
+        elif settings.db_statement_timeout_ms:
+            connect_args["server_settings"] = {"statement_timeout": str(settings.db_statement_timeout_ms)}
+
+    new_engine = create_async_engine(url, connect_args=connect_args, **options)
+    if isinstance(new_engine.sync_engine.pool, InstrumentedQueuePool):
+        new_engine.sync_engine.pool.pool_label = pool_label
+    return new_engine
+
+
+def pool_status(target: AsyncEngine) -> dict:
+    pool = target.sync_engine.pool
+    if not isinstance(pool, InstrumentedQueuePool):
+        return {"class": type(pool).__name__}
+    return {
+        "class": type(pool).__name__,
+        "size": pool.size(),
+        "max_overflow": pool._max_overflow,
+        "in_use": pool.checkedout(),
+        "idle": pool.checkedin(),
+        "overflow": max(0, pool.overflow()),
+        "timeout_seconds": pool.timeout(),
+    }
+
+###################################################
+# Engines and Sessions
+###################################################
+
+def init_engine() -> AsyncEngine:
+    global engine, replica_engines, _replica_cycle
+    if engine is None:
+        engine = build_engine(settings.database_dsn, "primary")
+        AsyncSessionLocal.configure(bind=engine)
+        replica_engines = [build_engine(dsn, f"replica{i}") for i, dsn in enumerate(settings.replica_dsns)]
+        _replica_cycle = itertools.cycle(replica_engines) if replica_engines else None
+    return engine
+
+async def dispose_engine() -> None:
+    global engine, replica_engines, _replica_cycle
+    for replica in replica_engines:
+        await replica.dispose()
+    if engine is not None:
+        await engine.dispose()
+    engine, replica_engines, _replica_cycle = None, [], None
+
+def open_replica_session() -> Optional[AsyncSession]:
+    """A session on the next read replica (round robin), or None when none are configured."""
+    init_engine()
+    if _replica_cycle is None:
+        return None
+    return AsyncSessionLocal(bind=next(_replica_cycle))
 
 # Dependency
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    init_engine()
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def get_replica_db():
+    # Connections are only checked out on first use, so write-only requests never touch a replica
+    db = open_replica_session()
+    if db is None:
+        yield None
+        return
+    async with db:
         yield db
-    finally:
-        db.close()
@@ -1,9 +1,16 @@
-from app.db.config import get_db
-from app.db.users.access import UsersRepository
+from fastapi import Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+from app.db.config import get_db, get_replica_db
+from app.db.tokens.access import AsyncTokensRepository
+from app.db.users.access import AsyncUsersRepository
 
-def get_users_repository() -> UsersRepository:
-    db = next(get_db())
-    try:
-        return UsersRepository(db)
-    finally:
-        db.close()
+def get_users_repository(
+    db: AsyncSession = Depends(get_db),
+    replica_db: Optional[AsyncSession] = Depends(get_replica_db),
+) -> AsyncUsersRepository:
+    # get_db/get_replica_db own the sessions and close them once the request has finished
+    return AsyncUsersRepository(db, replica_db)
+
+def get_tokens_repository(db: AsyncSession = Depends(get_db)) -> AsyncTokensRepository:
+    return AsyncTokensRepository(db)
@@ -0,0 +1,29 @@
+from cachetools import TTLCache
+from app.config import settings
+
+REPLICA_STICKY_SECONDS = settings.replica_sticky_seconds
+REPLICA_STICKY_MAX_KEYS = settings.replica_sticky_max_keys
+
+class WriteStickiness:
+    """
+    Remembers users written through this process so their reads go to the
+    primary until the replicas have had time to replay the write.
+
+    Kept per worker; a request landing on another worker within the window can
+    still read a lagging replica.
+    """
+
+    def __init__(self, window: float = REPLICA_STICKY_SECONDS, max_keys: int = REPLICA_STICKY_MAX_KEYS):
+        self._recent: TTLCache = TTLCache(maxsize=max_keys, ttl=window)
+
+    def mark(self, user_id: int) -> None:
+        self._recent[user_id] = True
+
+    def is_sticky(self, user_id: int) -> bool:
+        return user_id in self._recent
+
+    def clear(self) -> None:
+        self._recent.clear()
+
+
+write_stickiness = WriteStickiness()
@@ -0,0 +1,115 @@
+import hashlib
+import secrets
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+from sqlalchemy import delete, insert, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.tokens.models import RefreshToken, TokenRevocation
+from app.utils.metrics import REPOSITORY_QUERY_SECONDS, timed
+
+
+def utcnow() -> datetime:
+    # Columns are naive UTC timestamps, like users.created_at
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def hash_refresh_token(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+###################################################
+# Tokens Repository Class
+###################################################
+
+class AsyncTokensRepository:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    @timed(REPOSITORY_QUERY_SECONDS, "create_refresh_token")
+    async def create_refresh_token(self, user_id: int, expires_in: timedelta, family_id: Optional[str] = None) -> Tuple[str, str]:
+        token = secrets.token_urlsafe(32)
+        family_id = family_id or uuid.uuid4().hex
+        self.db.add(RefreshToken(
+            token_hash=hash_refresh_token(token),
+            family_id=family_id,
+            user_id=user_id,
+            expires_at=utcnow() + expires_in,
+        ))
+        await self.db.commit()
+        return token, family_id
+
+    @timed(REPOSITORY_QUERY_SECONDS, "use_refresh_token")
+    async def use_refresh_token(self, token: str) -> Optional[Tuple[int, str]]:
+        """
+        Marks a refresh token as used and returns its (user_id, family_id), or None
+        when it is unknown, expired, revoked or was already used.
+        """
+        now = utcnow()
+        # Conditional UPDATE so two concurrent refreshes cannot both win
+        result = await self.db.execute(
+            update(RefreshToken)
+            .where(
+                RefreshToken.token_hash == hash_refresh_token(token),
+                RefreshToken.used_at.is_(None),
+                RefreshToken.revoked_at.is_(None),
+                RefreshToken.expires_at > now,
+            )
+            .values(used_at=now)
+            .returning(RefreshToken.user_id, RefreshToken.family_id)
+        )
+        row = result.first()
+        await self.db.commit()
+        if row is None:
+            return None
+        return row.user_id, row.family_id
+
+    @timed(REPOSITORY_QUERY_SECONDS, "get_refresh_token")
+    async def get_refresh_token(self, token: str) -> Optional[RefreshToken]:
+        return await self.db.scalar(select(RefreshToken).where(RefreshToken.token_hash == hash_refresh_token(token)))
+
+    @timed(REPOSITORY_QUERY_SECONDS, "revoke_families")
+    async def revoke_families(self, family_ids: List[str], access_token_lifetime: timedelta) -> None:
+        if not family_ids:
+            return
+        now = utcnow()
+        await self.db.execute(
+            update(RefreshToken)
+            .where(RefreshToken.family_id.in_(family_ids), RefreshToken.revoked_at.is_(None))
+            .values(revoked_at=now)
+        )
+        # Access tokens issued from these families live at most one more access-token lifetime
+        await self.db.execute(
+            insert(TokenRevocation),
+            # created_at from the same UTC clock the pollers use, not the database's session time zone
+            [{"jti": family_id, "expires_at": now + access_token_lifetime, "created_at": now} for family_id in family_ids],
+        )
+        await self.db.commit()
+
+    @timed(REPOSITORY_QUERY_SECONDS, "get_user_families")
+    async def get_user_families(self, user_id: int) -> List[str]:
+        result = await self.db.scalars(
+            select(RefreshToken.family_id)
+            .where(RefreshToken.user_id == user_id, RefreshToken.revoked_at.is_(None))
+            .distinct()
+        )
+        return list(result)
+
+    @timed(REPOSITORY_QUERY_SECONDS, "get_revocations_after")
+    async def get_revocations_after(self, last_id: Optional[int], since: Optional[datetime]) -> List[Tuple[int, str, datetime]]:
+        """
+        Unexpired revocations with an id above last_id, plus any created since `since`.
+        The time window catches rows whose transactions committed after a higher id was
+        already seen; new rows are found by id whatever the clocks say.
+        """
+        query = select(TokenRevocation.id, TokenRevocation.jti, TokenRevocation.expires_at).where(TokenRevocation.expires_at > utcnow())
+        if last_id is not None:
+            newer = TokenRevocation.id > last_id
+            query = query.where(or_(newer, TokenRevocation.created_at >= since) if since is not None else newer)
+        result = await self.db.execute(query)
+        return [tuple(row) for row in result]
+
+    @timed(REPOSITORY_QUERY_SECONDS, "purge_expired_tokens")
+    async def purge_expired(self) -> None:
+        now = utcnow()
+        await self.db.execute(delete(TokenRevocation).where(TokenRevocation.expires_at <= now))
+        await self.db.execute(delete(RefreshToken).where(RefreshToken.expires_at <= now))
+        await self.db.commit()
@@ -0,0 +1,26 @@
+from sqlalchemy import Column, ForeignKey, Integer, String, TIMESTAMP, func
+from app.db.config import Base
+
+
+###################################################
+# SQLAlchemy Models
+###################################################
+
+class RefreshToken(Base):
+    __tablename__ = 'refresh_tokens'
+    # SHA-256 of the opaque token handed to the client; the token itself is never stored
+    token_hash = Column(String(64), primary_key=True)
+    family_id = Column(String(32), index=True, nullable=False)
+    user_id = Column(Integer, ForeignKey('users.user_id', ondelete='CASCADE'), index=True, nullable=False)
+    created_at = Column(TIMESTAMP, server_default=func.now(), nullable=False)
+    expires_at = Column(TIMESTAMP, nullable=False)
+    used_at = Column(TIMESTAMP, nullable=True)
+    revoked_at = Column(TIMESTAMP, nullable=True)
+
+class TokenRevocation(Base):
+    __tablename__ = 'token_revocations'
+    id = Column(Integer, primary_key=True)
+    # jti of an access token, or a refresh-token family id revoking every access token issued from it
+    jti = Column(String(32), nullable=False)
+    expires_at = Column(TIMESTAMP, nullable=False)
+    created_at = Column(TIMESTAMP, server_default=func.now(), nullable=False, index=True)
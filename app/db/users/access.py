@@ -1,85 +1,292 @@
-from app.auth.password import get_password_hash
-from sqlalchemy.orm import Session
-from sqlalchemy.orm import Session
-from typing import List, Optional
-from app.db.users.models import User, UserPublic, UserCreate, UserUpdate
+from app.auth.cache import principal_cache
+from app.auth.password import ahash_password, ahash_passwords
+from sqlalchemy import Row, bindparam, delete, func, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional
+from app.db.users.models import User, UserPublic, UserCreate, UserUpdate, UserBulkError, UserBulkResult
+from app.db.stickiness import write_stickiness
 from app.db.users.utils import convert_to_user_public
+from app.utils.metrics import DB_READS, REPOSITORY_QUERY_SECONDS, timed
+
+USER_PUBLIC_COLUMNS = (User.user_id, User.email, User.username, User.created_at, User.roles)
+USER_CREDENTIAL_COLUMNS = USER_PUBLIC_COLUMNS + (User.hashed_password,)
+
+# Statements are built once at import: SQLAlchemy memoizes their cache keys and compiled
+# SQL, and asyncpg keeps the matching prepared statements per connection. Read-only paths
+# select plain column tuples so nothing is loaded into, or tracked by, the identity map.
+# Email and username lookups compare lower() values, backed by the functional indexes in
+# migrations/0002_case_insensitive_user_lookups.sql.
+_SELECT_USER_PUBLIC = select(*USER_PUBLIC_COLUMNS).where(User.user_id == bindparam("user_id"))
+_SELECT_USER_PUBLIC_BY_EMAIL = select(*USER_PUBLIC_COLUMNS).where(func.lower(User.email) == func.lower(bindparam("email")))
+_SELECT_USER_PUBLIC_BY_USERNAME = select(*USER_PUBLIC_COLUMNS).where(func.lower(User.username) == func.lower(bindparam("username")))
+_SELECT_USER_CREDENTIALS_BY_USERNAME = select(*USER_CREDENTIAL_COLUMNS).where(func.lower(User.username) == func.lower(bindparam("username")))
+_SELECT_USERS_PAGE = (
+    select(*USER_PUBLIC_COLUMNS)
+    .where(User.user_id > bindparam("after"))
+    .order_by(User.user_id)
+    .limit(bindparam("limit"))
+)
+_SELECT_ALL_USERS = select(*USER_PUBLIC_COLUMNS).order_by(User.user_id)
+_SELECT_USERS_BY_IDS = select(*USER_PUBLIC_COLUMNS).where(User.user_id.in_(bindparam("user_ids", expanding=True)))
+
+_DIALECT_INSERTS = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
+
+
+class UserConflictError(Exception):
+    """Raised when a write would duplicate another user's email or username."""
+
+    def __init__(self, field: str):
+        super().__init__(f"{field} already exists")
+        self.field = field
+
+async def _first(db: AsyncSession, statement, params: dict) -> Optional[Row]:
+    return (await db.execute(statement, params)).first()
+
+async def _users_by_ids(db: AsyncSession, user_ids: List[int]) -> Dict[int, UserPublic]:
+    rows = await db.execute(_SELECT_USERS_BY_IDS, {"user_ids": user_ids})
+    return {row.user_id: convert_to_user_public(row) for row in rows}
 
 ###################################################
 # Users Repository Class
 ###################################################
 
-class UsersRepository:
-    def __init__(self, db: Session):
+class AsyncUsersRepository:
+    """
+    Writes go to the primary session. With a replica session, single-user and
+    page reads go to the replica, except for users written within the
+    stickiness window and users the replica does not have yet.
+    """
+
+    def __init__(self, db: AsyncSession, replica_db: Optional[AsyncSession] = None):
         self.db = db
+        self.replica_db = replica_db
 
-    def get_user(self, user_id: int) -> Optional[User]:
-        return self.db.query(User).filter(User.user_id == user_id).first()
+    async def _read(self, fetch: Callable[[AsyncSession], Awaitable], user_id: Optional[int] = None):
+        if self.replica_db is None:
+            return await fetch(self.db)
+        if user_id is not None and write_stickiness.is_sticky(user_id):
+            DB_READS.labels("primary_sticky").inc()
+            return await fetch(self.db)
+        result = await fetch(self.replica_db)
+        if result is None:
+            # Possibly a user created moments ago that the replica has not replayed yet
+            DB_READS.labels("primary_fallback").inc()
+            return await fetch(self.db)
+        if user_id is None and write_stickiness.is_sticky(result.user_id):
+            DB_READS.labels("primary_sticky").inc()
+            return await fetch(self.db)
+        DB_READS.labels("replica").inc()
+        return result
 
-    def get_user_by_email(self, email: str) -> Optional[User]:
-        return self.db.query(User).filter(User.email == email).first()
+    @timed(REPOSITORY_QUERY_SECONDS, "get_user_credentials")
+    async def get_user_credentials(self, username: str) -> Optional[Row]:
+        """Public columns plus hashed_password, for login; not tracked by the session."""
+        return await self._read(lambda db: _first(db, _SELECT_USER_CREDENTIALS_BY_USERNAME, {"username": username}))
 
-    def get_user_by_username(self, username: str) -> Optional[User]:
-        return self.db.query(User).filter(User.username == username).first()
+    @timed(REPOSITORY_QUERY_SECONDS, "get_users")
+    async def get_users(self, after: Optional[int] = None, limit: int = 100) -> List[UserPublic]:
+        # Keyset pagination: seek past the last user_id seen instead of using OFFSET
+        rows = await (self.replica_db or self.db).execute(_SELECT_USERS_PAGE, {"after": after or 0, "limit": limit})
+        return [convert_to_user_public(row) for row in rows]
 
-    def get_users(self, skip: int = 0, limit: int = 100) -> List[UserPublic]:
-        users = self.db.query(User).offset(skip).limit(limit).all()
-        return [convert_to_user_public(user) for user in users]
+    async def stream_users(self, batch_size: int = 1000) -> AsyncIterator[UserPublic]:
+        # Server-side cursor: only batch_size rows are buffered at any time
+        rows = await self.db.stream(_SELECT_ALL_USERS.execution_options(yield_per=batch_size))
+        async for row in rows:
+            yield convert_to_user_public(row)
 
-    def create_user(self, user: UserCreate) -> UserPublic:
-        db_user = User(
-            email=user.email,
-            username=user.username,
-            hashed_password=get_password_hash(user.password)
+    @timed(REPOSITORY_QUERY_SECONDS, "create_user")
+    async def create_user(self, user: UserCreate) -> UserPublic:
+        hashed_password = await ahash_password(user.password)
+        insert = _DIALECT_INSERTS[self.db.get_bind().dialect.name]
+        statement = (
+            insert(User.__table__)
+            .values(email=user.email, username=user.username, hashed_password=hashed_password)
+            .on_conflict_do_nothing()
+            .returning(*USER_PUBLIC_COLUMNS)
         )
-        self.db.add(db_user)
-        self.db.commit()
-        self.db.refresh(db_user)
-        return convert_to_user_public(db_user)
-
-    def update_user(self, user_id: int, user_update: UserUpdate) -> Optional[UserPublic]:
-        db_user = self.get_user(user_id)
-        if db_user is None:
-            return None
+        row = await self._write(statement)
+        if row is None:
+            raise UserConflictError(await self._conflicting_field(user.email, user.username))
+        return convert_to_user_public(row)
+
+    @timed(REPOSITORY_QUERY_SECONDS, "create_users")
+    async def create_users(self, users: List[UserCreate], batch_size: int = 1000) -> UserBulkResult:
+        """
+        Creates many users at once, reporting duplicate emails/usernames per row
+        instead of failing the whole import.
+        """
+        created: List[UserPublic] = []
+        errors: List[UserBulkError] = []
 
-        update_data = user_update.dict(exclude_unset=True)
-        for key, value in update_data.items():
-            if key == 'password' and value is not None:
-                db_user.hashed_password = get_password_hash(value)
-            elif key == "roles":
-                continue
+        # Duplicates inside the request itself, ignoring case like the lookups do; the first occurrence wins
+        seen_emails, seen_usernames, pending = set(), set(), []
+        for index, user in enumerate(users):
+            if user.email.lower() in seen_emails:
+                errors.append(UserBulkError(index=index, email=user.email, username=user.username, reason="duplicate email in request"))
+            elif user.username.lower() in seen_usernames:
+                errors.append(UserBulkError(index=index, email=user.email, username=user.username, reason="duplicate username in request"))
             else:
-                setattr(db_user, key, value)
+                seen_emails.add(user.email.lower())
+                seen_usernames.add(user.username.lower())
+                pending.append((index, user))
 
-        self.db.commit()
-        self.db.refresh(db_user)
-        return convert_to_user_public(db_user)
+        hashed_passwords = await ahash_passwords([user.password for _, user in pending])
+        insert = _DIALECT_INSERTS[self.db.get_bind().dialect.name]
 
-    def delete_user(self, user_id: int) -> Optional[UserPublic]:
-        db_user = self.get_user(user_id)
-        if db_user is None:
+        # Each batch commits on its own; a failing batch is rolled back so the session stays usable
+        try:
+            for start in range(0, len(pending), batch_size):
+                batch = pending[start:start + batch_size]
+                rows = [
+                    {"email": user.email, "username": user.username, "hashed_password": hashed_password}
+                    for (_, user), hashed_password in zip(batch, hashed_passwords[start:start + batch_size])
+                ]
+                # Rows clashing with existing users are skipped by the database and left out of RETURNING
+                statement = insert(User.__table__).on_conflict_do_nothing().returning(*USER_PUBLIC_COLUMNS)
+                result = await self.db.execute(statement, rows)
+                inserted = {row.username: row for row in result}
+                created.extend(convert_to_user_public(row) for row in inserted.values())
+
+                conflicts = [(index, user) for index, user in batch if user.username not in inserted]
+                if conflicts:
+                    existing = await self.db.execute(
+                        select(func.lower(User.email), func.lower(User.username)).where(or_(
+                            func.lower(User.email).in_([user.email.lower() for _, user in conflicts]),
+                            func.lower(User.username).in_([user.username.lower() for _, user in conflicts]),
+                        ))
+                    )
+                    existing_emails, existing_usernames = set(), set()
+                    for email, username in existing:
+                        existing_emails.add(email)
+                        existing_usernames.add(username)
+                    for index, user in conflicts:
+                        reason = "email already exists" if user.email.lower() in existing_emails else "username already exists"
+                        errors.append(UserBulkError(index=index, email=user.email, username=user.username, reason=reason))
+                await self.db.commit()
+        except BaseException:
+            await self.db.rollback()
+            raise
+
+        errors.sort(key=lambda error: error.index)
+        return UserBulkResult(created=created, errors=errors)
+
+    @timed(REPOSITORY_QUERY_SECONDS, "update_user")
+    async def update_user(self, user_id: int, user_update: UserUpdate) -> Optional[UserPublic]:
+        values = {}
+        for key, value in user_update.model_dump(exclude_unset=True).items():
+            if key == "password":
+                if value is not None:
+                    values["hashed_password"] = await ahash_password(value)
+            elif key != "roles":
+                values[key] = value
+        if not values:
+            return await self.get_user_public(user_id)
+        try:
+            row = await self._update(user_id, values)
+        except UserConflictError:
+            raise UserConflictError(await self._conflicting_field(values.get("email"), values.get("username"), user_id))
+        if row is None:
             return None
-        self.db.delete(db_user)
-        self.db.commit()
-        return convert_to_user_public(db_user)
+        user = convert_to_user_public(row)
+        write_stickiness.mark(user_id)
+        principal_cache.set(user)
+        return user
 
-    def get_user_public(self, user_id: int) -> Optional[UserPublic]:
-        db_user = self.get_user(user_id)
-        if db_user is None:
+    @timed(REPOSITORY_QUERY_SECONDS, "update_password_hash")
+    async def update_password_hash(self, user_id: int, hashed_password: str) -> None:
+        # No RETURNING and no unique column touched, so _write's row fetch and conflict mapping do not apply
+        try:
+            await self.db.execute(update(User).where(User.user_id == user_id).values(hashed_password=hashed_password))
+            await self.db.commit()
+        except BaseException:
+            await self.db.rollback()
+            raise
+        write_stickiness.mark(user_id)
+
+    @timed(REPOSITORY_QUERY_SECONDS, "delete_user")
+    async def delete_user(self, user_id: int) -> Optional[UserPublic]:
+        row = await self._write(delete(User).where(User.user_id == user_id).returning(*USER_PUBLIC_COLUMNS))
+        if row is None:
             return None
-        return convert_to_user_public(db_user)
+        write_stickiness.mark(user_id)
+        principal_cache.invalidate(user_id)
+        return convert_to_user_public(row)
+
+    @timed(REPOSITORY_QUERY_SECONDS, "get_user_public")
+    async def get_user_public(self, user_id: int) -> Optional[UserPublic]:
+        return await self._get_public(_SELECT_USER_PUBLIC, {"user_id": user_id}, user_id)
+
+    @timed(REPOSITORY_QUERY_SECONDS, "get_users_public")
+    async def get_users_public(self, user_ids: Iterable[int]) -> Dict[int, UserPublic]:
+        """Resolves many users in one IN query; ids that do not exist are left out."""
+        user_ids = list(user_ids)
+        if not user_ids:
+            return {}
+        db = self.db
+        if self.replica_db is not None and not any(write_stickiness.is_sticky(user_id) for user_id in user_ids):
+            db = self.replica_db
+        users = await _users_by_ids(db, user_ids)
+        missing = [user_id for user_id in user_ids if user_id not in users]
+        if db is self.replica_db and missing:
+            # Possibly users created moments ago that the replica has not replayed yet
+            DB_READS.labels("primary_fallback").inc()
+            users.update(await _users_by_ids(self.db, missing))
+        return users
 
-    def get_user_public_by_username(self, username: str) -> Optional[UserPublic]:
-        db_user = self.get_user_by_username(username)
-        if db_user is None:
+    @timed(REPOSITORY_QUERY_SECONDS, "get_user_public_by_email")
+    async def get_user_public_by_email(self, email: str) -> Optional[UserPublic]:
+        return await self._get_public(_SELECT_USER_PUBLIC_BY_EMAIL, {"email": email})
+
+    @timed(REPOSITORY_QUERY_SECONDS, "get_user_public_by_username")
+    async def get_user_public_by_username(self, username: str) -> Optional[UserPublic]:
+        return await self._get_public(_SELECT_USER_PUBLIC_BY_USERNAME, {"username": username})
+
+    async def _get_public(self, statement, params: dict, user_id: Optional[int] = None) -> Optional[UserPublic]:
+        row = await self._read(lambda db: _first(db, statement, params), user_id)
+        if row is None:
             return None
-        return convert_to_user_public(db_user)
+        return convert_to_user_public(row)
 
-    def update_user_roles(self, user_id: int, new_roles: str) -> Optional[UserPublic]:
-        db_user = self.get_user(user_id)
-        if db_user is None:
+    @timed(REPOSITORY_QUERY_SECONDS, "update_user_roles")
+    async def update_user_roles(self, user_id: int, new_roles: str) -> Optional[UserPublic]:
+        row = await self._update(user_id, {"roles": new_roles})
+        if row is None:
             return None
-        db_user.roles = new_roles
-        self.db.commit()
-        self.db.refresh(db_user)
-        return convert_to_user_public(db_user)
+        user = convert_to_user_public(row)
+        write_stickiness.mark(user_id)
+        principal_cache.set(user)
+        return user
+
+    async def _update(self, user_id: int, values: dict) -> Optional[Row]:
+        statement = update(User).where(User.user_id == user_id).values(**values).returning(*USER_PUBLIC_COLUMNS)
+        # Nothing is loaded into the session, so there is nothing to synchronize
+        return await self._write(statement.execution_options(synchronize_session=False))
+
+    async def _write(self, statement) -> Optional[Row]:
+        """Runs one write statement and commits it, rolling back on any failure."""
+        try:
+            row = (await self.db.execute(statement)).first()
+            await self.db.commit()
+        except IntegrityError:
+            await self.db.rollback()
+            raise UserConflictError("email or username")
+        except BaseException:
+            await self.db.rollback()
+            raise
+        return row
+
+    async def _conflicting_field(self, email: Optional[str], username: Optional[str], user_id: Optional[int] = None) -> str:
+        # Only reached on the error path, to tell the caller which value is taken
+        if email is not None:
+            query = select(User.user_id).where(func.lower(User.email) == email.lower())
+            if user_id is not None:
+                query = query.where(User.user_id != user_id)
+            if await self.db.scalar(query.limit(1)) is not None:
+                return "email"
+        return "username"
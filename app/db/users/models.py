@@ -1,5 +1,6 @@
-from sqlalchemy import Column, Integer, String, TIMESTAMP, func
-from pydantic import BaseModel
+from sqlalchemy import Column, Index, Integer, String, TIMESTAMP, func
+from datetime import datetime
+from pydantic import BaseModel, ConfigDict, field_validator
 from typing import List, Optional
 from app.db.config import Base
 
@@ -16,6 +17,15 @@ class User(Base):
     hashed_password = Column(String, nullable=False)
     created_at = Column(TIMESTAMP, server_default=func.now(), nullable=False)
     roles = Column(String, server_default="user", nullable=False)
+    # Maintained by the audit writer; see migrations/0003_audit_events.sql
+    last_login_at = Column(TIMESTAMP, nullable=True)
+    failed_login_count = Column(Integer, server_default="0", nullable=False)
+
+    # Case-insensitive lookups; see migrations/0002_case_insensitive_user_lookups.sql
+    __table_args__ = (
+        Index("ix_users_email_lower", func.lower(email), unique=True),
+        Index("ix_users_username_lower", func.lower(username), unique=True),
+    )
 
 ###################################################
 # Pydantic Schemas
@@ -37,5 +47,26 @@ class UserUpdate(BaseModel):
     password: Optional[str] = None
 
 class UserPublic(UserBase):
+    # Built straight from ORM objects or result rows by attribute access
+    model_config = ConfigDict(from_attributes=True)
+
     user_id: int
     created_at: str
+
+    @field_validator("created_at", mode="before")
+    @classmethod
+    def format_created_at(cls, value):
+        return value.isoformat() if isinstance(value, datetime) else value
+
+class UserBulkCreate(BaseModel):
+    users: List[UserCreate]
+
+class UserBulkError(BaseModel):
+    index: int
+    email: str
+    username: str
+    reason: str
+
+class UserBulkResult(BaseModel):
+    created: List[UserPublic]
+    errors: List[UserBulkError]
@@ -1,3 +1,5 @@
+from typing import Union
+from sqlalchemy import Row
 from app.db.users.models import User, UserPublic
 
 
@@ -5,11 +7,5 @@ from app.db.users.models import User, UserPublic
 # Conversion Functions
 ###################################################
 
-def convert_to_user_public(user: User) -> UserPublic:
-    return UserPublic(
-        user_id=user.user_id,
-        email=user.email,
-        username=user.username,
-        created_at=user.created_at.isoformat(),
-        roles=user.roles
-    )
+def convert_to_user_public(user: Union[User, Row]) -> UserPublic:
+    return UserPublic.model_validate(user)
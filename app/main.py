@@ -1,19 +1,45 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.responses import RedirectResponse
 from fastapi.middleware.cors import CORSMiddleware
-import os
-from dotenv import load_dotenv
+import logging
 from app.routers.v1 import users as v1_users_routes
 from app.routers import token as token_routes
+from app.routers import jwks as jwks_routes
+from app.routers import metrics as metrics_routes
+from app.routers import health as health_routes
+from app.routers import profiles as profiles_routes
+from app.auth.revocation import revocation_list
+from app.auth.password import BCRYPT_ROUNDS, BCRYPT_TARGET_MS, password_hasher
+from app.db.config import dispose_engine, init_engine
+from app.utils.audit import audit_log
+from app.utils.email_service import email_dispatcher
+from app.utils.logging_config import configure_logging
+from app.utils.profiling import PROFILING_ENABLED, ProfilingMiddleware
+from app.utils.responses import ModelJSONResponse
 
+configure_logging()
 
-# Load environment variables from .env file
-load_dotenv()
-
-ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES"))
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Heavy resources are built here rather than at import; the SES client is built on the first send
+    init_engine()
+    if BCRYPT_TARGET_MS and BCRYPT_ROUNDS is None:
+        rounds = await password_hasher.calibrate(BCRYPT_TARGET_MS)
+        logging.getLogger(__name__).info("Calibrated bcrypt cost", extra={"rounds": rounds, "target_ms": BCRYPT_TARGET_MS})
+    email_dispatcher.start()
+    audit_log.start()
+    await revocation_list.start()
+    yield
+    await revocation_list.stop()
+    await email_dispatcher.stop()
+    # Drained before the engine goes away
+    await audit_log.stop()
+    password_hasher.shutdown()
+    await dispose_engine()
 
 # Application Initialization
-app = FastAPI()
+app = FastAPI(lifespan=lifespan, default_response_class=ModelJSONResponse)
 
 version = "v1.0"
 
@@ -29,8 +55,14 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["DELETE", "GET", "POST", "PUT"],
     allow_headers=["*"],
+    # Browsers hide response headers from other origins unless listed; paging needs the cursor
+    expose_headers=["X-Next-Cursor"],
 )
 
+# Added last so it wraps everything else; not installed at all unless a sample rate or token is set
+if PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
+
 app.include_router(
     token_routes.router,
     prefix="/token",
@@ -42,3 +74,27 @@ app.include_router(
     prefix="/api/v1/users",
     tags=[version, "users"]
 )
+
+app.include_router(
+    jwks_routes.router,
+    prefix="/.well-known",
+    tags=["Auth"]
+)
+
+app.include_router(
+    metrics_routes.router,
+    prefix="/metrics",
+    tags=["Monitoring"]
+)
+
+app.include_router(
+    health_routes.router,
+    prefix="/health",
+    tags=["Monitoring"]
+)
+
+app.include_router(
+    profiles_routes.router,
+    prefix="/profiles",
+    tags=["Monitoring"]
+)
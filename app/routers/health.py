@@ -0,0 +1,48 @@
+import asyncio
+import time
+from fastapi import APIRouter
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+from app.config import settings
+from app.db import config as db_config
+from app.utils.responses import ModelJSONResponse
+
+HEALTH_DB_TIMEOUT_SECONDS = settings.health_db_timeout_seconds
+
+router = APIRouter()
+
+
+async def check_engine(target: AsyncEngine) -> dict:
+    async def ping() -> None:
+        async with target.connect() as connection:
+            await connection.execute(text("SELECT 1"))
+
+    started = time.perf_counter()
+    try:
+        # Bounded well below the pool timeout so a saturated pool fails the check instead of hanging it
+        await asyncio.wait_for(ping(), HEALTH_DB_TIMEOUT_SECONDS)
+        status, error = "ok", None
+    except Exception as exc:
+        status, error = "down", type(exc).__name__
+    result = {
+        "status": status,
+        "latency_ms": (time.perf_counter() - started) * 1000,
+        "pool": db_config.pool_status(target),
+    }
+    if error:
+        result["error"] = error
+    return result
+
+
+@router.get("/db", response_description="Database connectivity and connection pool usage")
+async def database_health() -> ModelJSONResponse:
+    primary = db_config.init_engine()
+    results = await asyncio.gather(check_engine(primary), *(check_engine(replica) for replica in db_config.replica_engines))
+    body = {
+        "status": results[0]["status"],
+        "primary": results[0],
+        "replicas": results[1:],
+        # Multiply by the worker count to compare against the database's max_connections
+        "max_connections_per_engine": settings.db_pool_size + settings.db_max_overflow,
+    }
+    return ModelJSONResponse(body, status_code=200 if body["status"] == "ok" else 503)
@@ -0,0 +1,10 @@
+from fastapi import APIRouter, Response
+from app.auth.keys import JWKS_MAX_AGE_SECONDS, key_ring
+
+router = APIRouter()
+
+
+@router.get("/jwks.json", response_description="Public keys for verifying access tokens")
+async def jwks_endpoint(response: Response) -> dict:
+    response.headers["Cache-Control"] = f"public, max-age={JWKS_MAX_AGE_SECONDS}"
+    return key_ring.jwks()
@@ -0,0 +1,10 @@
+from fastapi import APIRouter, Response
+from prometheus_client import CONTENT_TYPE_LATEST
+from app.utils.metrics import render_metrics
+
+router = APIRouter()
+
+
+@router.get("", response_description="Prometheus metrics", include_in_schema=False)
+async def metrics_endpoint() -> Response:
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,27 @@
+import asyncio
+from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import FileResponse, PlainTextResponse
+from app.auth.permissions import Permission, require_permissions
+from app.schemas.profile import ProfileInfo
+from app.utils.profiling import profile_store
+from app.utils.responses import ModelJSONResponse
+
+router = APIRouter(dependencies=[Depends(require_permissions(Permission.PROFILES_READ))])
+
+
+@router.get("", response_description="Stored request profiles, newest first", response_model=List[ProfileInfo])
+async def list_profiles_endpoint():
+    return ModelJSONResponse(await asyncio.to_thread(profile_store.list))
+
+@router.get("/{profile_id}", response_description="Download a request profile")
+async def download_profile_endpoint(
+    profile_id: str,
+    format: str = Query("pstats", pattern="^(pstats|text)$", description="pstats dump, or the top functions by cumulative time as text"),
+):
+    path = profile_store.path_for(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found.")
+    if format == "text":
+        return PlainTextResponse(await asyncio.to_thread(profile_store.summary, profile_id))
+    return FileResponse(path, media_type="application/octet-stream", filename=path.name)
@@ -1,33 +1,104 @@
-from fastapi import Depends, APIRouter, HTTPException
+from fastapi import Depends, APIRouter, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from app.auth.logic import authenticate_user, create_access_token
-from dotenv import load_dotenv
-import os
-from app.schemas.token import Token
-from datetime import datetime, timedelta, timezone
-from app.db.users.access import UsersRepository
-from app.db.users.models import UserPublic, UserCreate, UserUpdate
-from app.db.repositories import get_users_repository
+from app.auth.cache import principal_cache
+from app.auth.logic import ACCESS_TOKEN_LIFETIME, authenticate_user, introspect, issue_tokens
+from app.auth.permissions import Permission, require_permissions
+from app.auth.revocation import revocation_list
+from app.auth.throttle import login_throttle
+from app.utils.admission import admission_controller
+from app.utils.metrics import AUTH_FAILURES
+from app.config import settings
+from app.schemas.token import IntrospectionRequest, IntrospectionResponse, RefreshTokenRequest, Token
+from app.db.tokens.access import AsyncTokensRepository, utcnow
+from app.db.users.access import AsyncUsersRepository
+from app.db.repositories import get_tokens_repository, get_users_repository
 
-load_dotenv()
-
-ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES"))
+INTROSPECTION_MAX_ITEMS = settings.introspection_max_items
 
 router = APIRouter()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+invalid_refresh_token = HTTPException(
+    status_code=status.HTTP_401_UNAUTHORIZED,
+    detail="Invalid refresh token",
+    headers={"WWW-Authenticate": "Bearer"},
+)
+
 
 @router.post("/", response_model=Token)
-async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), users_repo: UsersRepository = Depends(get_users_repository)) -> Token:
-    user = authenticate_user(form_data.username, form_data.password, users_repo)
+async def login_for_access_token(
+    request: Request,
+    form_data: OAuth2PasswordRequestForm = Depends(),
+    users_repo: AsyncUsersRepository = Depends(get_users_repository),
+    tokens_repo: AsyncTokensRepository = Depends(get_tokens_repository)
+) -> Token:
+    # Reject floods before they reach the database or bcrypt
+    client_ip = request.client.host if request.client else None
+    retry_after = await login_throttle.hit(form_data.username, client_ip)
+    if retry_after is not None:
+        AUTH_FAILURES.labels("throttled").inc()
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many login attempts",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+    # Taken after the throttle check so throttled attempts get their 429 without waiting for a slot
+    async with admission_controller.slot():
+        user = await authenticate_user(form_data.username, form_data.password, users_repo, client_ip)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    access_token_expires =  timedelta(days=1)
-    access_token = create_access_token(
-        data={"user":{"user_id":user.user_id, "username":user.username, "email":user.email, "roles":user.roles}}, expires_delta=access_token_expires
-    )
-    return Token(access_token=access_token, token_type="bearer")
+    await login_throttle.reset(form_data.username)
+    return await issue_tokens(user, tokens_repo)
+
+
+@router.post("/refresh", response_model=Token)
+async def refresh_access_token(
+    request: RefreshTokenRequest,
+    users_repo: AsyncUsersRepository = Depends(get_users_repository),
+    tokens_repo: AsyncTokensRepository = Depends(get_tokens_repository)
+) -> Token:
+    used = await tokens_repo.use_refresh_token(request.refresh_token)
+    if used is None:
+        stored = await tokens_repo.get_refresh_token(request.refresh_token)
+        if stored is not None and stored.used_at is not None and stored.revoked_at is None:
+            # A rotated-out token was replayed: assume it leaked and end the whole session
+            await tokens_repo.revoke_families([stored.family_id], ACCESS_TOKEN_LIFETIME)
+            revocation_list.add(stored.family_id, utcnow() + ACCESS_TOKEN_LIFETIME)
+            AUTH_FAILURES.labels("refresh_token_reuse").inc()
+        else:
+            AUTH_FAILURES.labels("invalid_refresh_token").inc()
+        raise invalid_refresh_token
+
+    user_id, family_id = used
+    user = principal_cache.get(user_id) or await users_repo.get_user_public(user_id)
+    if user is None:
+        raise invalid_refresh_token
+    return await issue_tokens(user, tokens_repo, family_id)
+
+
+@router.post("/revoke", status_code=status.HTTP_204_NO_CONTENT)
+async def revoke_refresh_token(
+    request: RefreshTokenRequest,
+    tokens_repo: AsyncTokensRepository = Depends(get_tokens_repository)
+) -> None:
+    stored = await tokens_repo.get_refresh_token(request.refresh_token)
+    if stored is None:
+        return
+    await tokens_repo.revoke_families([stored.family_id], ACCESS_TOKEN_LIFETIME)
+    revocation_list.add(stored.family_id, utcnow() + ACCESS_TOKEN_LIFETIME)
+
+
+@router.post("/introspect", response_model=IntrospectionResponse, dependencies=[Depends(require_permissions(Permission.TOKENS_INTROSPECT))])
+async def introspect_tokens(
+    request: IntrospectionRequest,
+    users_repo: AsyncUsersRepository = Depends(get_users_repository)
+) -> IntrospectionResponse:
+    # Lets gateways check many tokens and users per call instead of one GET per request
+    if len(request.tokens) + len(request.user_ids) > INTROSPECTION_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {INTROSPECTION_MAX_ITEMS} tokens and user ids can be introspected per request.")
+    return await introspect(request.tokens, request.user_ids, users_repo)
@@ -1,92 +1,143 @@
-from typing import List
+from typing import AsyncIterator, List, Optional
 from app.schemas.password import PasswordResetRequest
-from app.utils.email_service import send_email
+from app.utils.admission import admit_expensive
+from app.utils.audit import record_event
+from app.utils.email_service import queue_email
 from app.utils.reset_password import create_reset_password_token, get_user_id_from_reset_password_token
-from fastapi import BackgroundTasks, Depends, APIRouter, HTTPException
-from fastapi.security import OAuth2PasswordBearer
-from app.auth.logic import get_current_user, update_user, update_user_password
-from dotenv import load_dotenv
-import os
-from app.db.users.access import UsersRepository
-from app.db.users.models import UserPublic, UserCreate, UserUpdate
-from app.db.repositories import get_users_repository
-from app.schemas.token import Token
+from fastapi import Depends, APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from app.utils.responses import ModelJSONResponse
+from app.auth.logic import get_current_user, revoke_user_sessions, update_user, update_user_password, verify_access_token
+from app.auth.password import oauth2_scheme
+from app.auth.permissions import Permission, require_permissions
+from app.config import settings
+import logging
+from app.db.audit.models import PASSWORD_RESET, USER_DELETED, USER_UPDATED
+from app.db.users.access import AsyncUsersRepository, UserConflictError
+from app.db.users.models import UserPublic, UserCreate, UserUpdate, UserBulkCreate, UserBulkResult
+from app.db.config import AsyncSessionLocal, open_replica_session
+from app.db.repositories import get_tokens_repository, get_users_repository
+from app.db.tokens.access import AsyncTokensRepository
+from app.schemas.token import Token, TokenData
 from datetime import datetime, timedelta, timezone
 
-load_dotenv()
+RESET_PASSWORD_TOKEN_EXPIRE_MINUTES = settings.reset_password_token_expire_minutes
+FRONTEND_RESET_PASSWORD_URL = settings.frontend_reset_password_url
 
-ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES"))
-TEST_SES_RECIPIENT = os.getenv("TEST_SES_RECIPIENT")
+USERS_PAGE_MAX_LIMIT = settings.users_page_max_limit
+USERS_EXPORT_BATCH_SIZE = settings.users_export_batch_size
+USERS_BULK_MAX_ROWS = settings.users_bulk_max_rows
+USERS_BULK_BATCH_SIZE = settings.users_bulk_batch_size
 
-RESET_PASSWORD_TOKEN_EXPIRE_MINUTES = int(os.getenv("RESET_PASSWORD_TOKEN_EXPIRE_MINUTES", 15))
-FRONTEND_RESET_PASSWORD_URL = os.getenv("FRONTEND_RESET_PASSWORD_URL")
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-@router.post("/", response_description="Create a new user", response_model=UserPublic)
+def client_ip(request: Request) -> Optional[str]:
+    return request.client.host if request.client else None
+
+
+
+@router.post("/", response_description="Create a new user", response_model=UserPublic, dependencies=[Depends(admit_expensive)])
 async def create_user_endpoint(
     user: UserCreate,
-    users_repo: UsersRepository = Depends(get_users_repository)
+    users_repo: AsyncUsersRepository = Depends(get_users_repository)
 ):
     newUser = UserCreate(email=user.email, username=user.username, password=user.password)
-    result = users_repo.create_user(newUser)
+    try:
+        result = await users_repo.create_user(newUser)
+    except UserConflictError as error:
+        raise HTTPException(status_code=409, detail=f"A user with this {error.field} already exists.")
     if not result:
         raise HTTPException(status_code=400, detail="User could not be created.")
-    return result
+    return ModelJSONResponse(result)
+
+@router.post("/bulk", response_description="Create many users at once", response_model=UserBulkResult, dependencies=[Depends(require_permissions(Permission.USERS_CREATE_BULK)), Depends(admit_expensive)])
+async def bulk_create_users_endpoint(
+    request: UserBulkCreate,
+    users_repo: AsyncUsersRepository = Depends(get_users_repository)
+):
+    if len(request.users) > USERS_BULK_MAX_ROWS:
+        raise HTTPException(status_code=413, detail=f"At most {USERS_BULK_MAX_ROWS} users can be created per request.")
+    return ModelJSONResponse(await users_repo.create_users(request.users, batch_size=USERS_BULK_BATCH_SIZE))
 
-@router.get("/", response_description="Read all users", response_model=List[UserPublic])
+@router.get("/", response_description="Read a page of users", response_model=List[UserPublic], dependencies=[Depends(require_permissions(Permission.USERS_LIST))])
 async def read_all_users_endpoint(
-    users_repo: UsersRepository = Depends(get_users_repository)
+    after: Optional[int] = Query(None, description="Return users with a user_id greater than this cursor"),
+    limit: int = Query(100, ge=1, le=USERS_PAGE_MAX_LIMIT),
+    users_repo: AsyncUsersRepository = Depends(get_users_repository)
 ):
-    users = users_repo.get_users()
+    users = await users_repo.get_users(after=after, limit=limit)
     if users is None:
         raise HTTPException(status_code=404, detail="No users found.")
-    return users
+    headers = {"X-Next-Cursor": str(users[-1].user_id)} if len(users) == limit else None
+    return ModelJSONResponse(users, headers=headers)
+
+@router.get("/export", response_description="Stream all users as NDJSON", dependencies=[Depends(require_permissions(Permission.USERS_EXPORT))])
+async def export_users_endpoint():
+    async def generate() -> AsyncIterator[str]:
+        # Dependencies are torn down before a streamed body is sent, so the stream owns its session
+        async with open_replica_session() or AsyncSessionLocal() as db:
+            async for user in AsyncUsersRepository(db).stream_users(USERS_EXPORT_BATCH_SIZE):
+                yield user.model_dump_json() + "\n"
 
-@router.get("/{user_id}", response_description="Read a user by ID", response_model=UserPublic)
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+@router.get("/{user_id}", response_description="Read a user by ID", response_model=UserPublic, dependencies=[Depends(require_permissions(Permission.USERS_READ))])
 async def read_user_by_id_endpoint(
     user_id: int,
-    token: str = Depends(oauth2_scheme),
-    users_repo: UsersRepository = Depends(get_users_repository)
+    users_repo: AsyncUsersRepository = Depends(get_users_repository)
 ):
-    user = users_repo.get_user_public(user_id)
+    user = await users_repo.get_user_public(user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found.")
-    return user
+    return ModelJSONResponse(user)
 
 @router.put("", response_description="Update a user's information")
 async def update_user_info_endpoint(
+    request: Request,
     user: UserUpdate,
+    token: str = Depends(oauth2_scheme),
     current_user: UserPublic = Depends(get_current_user),
-    users_repo: UsersRepository = Depends(get_users_repository)
+    users_repo: AsyncUsersRepository = Depends(get_users_repository),
+    tokens_repo: AsyncTokensRepository = Depends(get_tokens_repository)
 ):
-    updated_token = update_user(current_user.user_id, user.email or current_user.email, user.username or current_user.username, user.password, users_repo)
+    # Already verified by get_current_user, so this is a token cache hit
+    family_id = verify_access_token(token).family_id
+    try:
+        updated_token = await update_user(current_user.user_id, user.email or current_user.email, user.username or current_user.username, user.password, users_repo, tokens_repo, family_id)
+    except UserConflictError as error:
+        raise HTTPException(status_code=409, detail=f"A user with this {error.field} already exists.")
     if updated_token is None:
         raise HTTPException(status_code=400, detail="User update failed.")
     else:
+        record_event(USER_UPDATED, user_id=current_user.user_id, actor_id=current_user.user_id, ip=client_ip(request))
         return Token(access_token=updated_token, token_type="bearer")
 
 @router.delete("/{user_id}", response_description="Delete a user", response_model=UserPublic)
 async def delete_user_endpoint(
     user_id: int,
-    token: str = Depends(oauth2_scheme),
-    users_repo: UsersRepository = Depends(get_users_repository)
+    request: Request,
+    principal: TokenData = Depends(require_permissions(Permission.USERS_DELETE)),
+    users_repo: AsyncUsersRepository = Depends(get_users_repository),
+    tokens_repo: AsyncTokensRepository = Depends(get_tokens_repository)
 ):
-    success = users_repo.delete_user(user_id)
+    # Revoke first: deleting the user cascades to the refresh tokens that name its sessions
+    await revoke_user_sessions(user_id, tokens_repo)
+    success = await users_repo.delete_user(user_id)
     if not success:
         raise HTTPException(status_code=400, detail="User deletion failed.")
-    return success
+    record_event(USER_DELETED, user_id=user_id, actor_id=principal.user_id, ip=client_ip(request))
+    return ModelJSONResponse(success)
 
 
 @router.post("/request-password-reset", response_description="Request password reset")
 async def request_password_reset(
     email: str,
-    background_tasks: BackgroundTasks,
-    users_repo: UsersRepository = Depends(get_users_repository)
+    users_repo: AsyncUsersRepository = Depends(get_users_repository)
 ):
     # Verify if the email exists
-    user = users_repo.get_user_by_email(email)
+    user = await users_repo.get_user_public_by_email(email)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
@@ -102,36 +153,38 @@ async def request_password_reset(
     {url}
     """
 
-    # Send the reset email
-    background_tasks.add_task(send_email, recipient=email, subject="Reset Password", body_text=email_content.format(url=reset_url))
+    # Queue the reset email; repeated requests for one address collapse into a single send
+    queued = queue_email(recipient=email, subject="Reset Password", body_text=email_content.format(url=reset_url), coalesce_key=("reset-password", email.lower()))
+    if not queued:
+        raise HTTPException(status_code=503, detail="Too many pending emails, try again later", headers={"Retry-After": "30"})
 
     return {"msg": "Password reset email sent"}
 
 
-@router.post("/reset-password", response_description="Reset password")
+@router.post("/reset-password", response_description="Reset password", dependencies=[Depends(admit_expensive)])
 async def reset_password(
     request: PasswordResetRequest,
-    users_repo: UsersRepository = Depends(get_users_repository)
+    http_request: Request,
+    users_repo: AsyncUsersRepository = Depends(get_users_repository),
+    tokens_repo: AsyncTokensRepository = Depends(get_tokens_repository)
 ):
     # Decode the JWT token
     user_id = get_user_id_from_reset_password_token(request.token)
     if user_id is None:
         raise HTTPException(status_code=400, detail="Invalid token")
 
-
-    # Retrieve user by user_id
-    user = users_repo.get_user(user_id)
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    updated_user = update_user_password(user_id, request.new_password, users_repo)
-
+    # The UPDATE reports whether the user still exists
+    updated_user = await update_user_password(user_id, request.new_password, users_repo)
     if not updated_user:
-        raise HTTPException(status_code=500, detail="Failed to reset password")
-    print("User Password Updated", updated_user)
+        raise HTTPException(status_code=404, detail="User not found")
+    # Sessions opened with the old password end with it
+    await revoke_user_sessions(user_id, tokens_repo)
+    logger.info("Password reset", extra={"user_id": user_id})
+    record_event(PASSWORD_RESET, user_id=user_id, actor_id=user_id, ip=client_ip(http_request))
     return {"msg": "Password successfully reset"}
 
 @router.post("Test AWS SES", response_description="Sendtest email")
 async def send_reset_password_email_endpoint(email: str):
-    send_email(email, "Namex Test Email", "Email content here...")
-    return {"message": "Email sent."}
+    if not queue_email(email, "Namex Test Email", "Email content here..."):
+        raise HTTPException(status_code=503, detail="Too many pending emails, try again later", headers={"Retry-After": "30"})
+    return {"message": "Email queued."}
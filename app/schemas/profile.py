@@ -0,0 +1,10 @@
+from pydantic import BaseModel
+
+
+class ProfileInfo(BaseModel):
+    profile_id: str
+    created_at: str
+    method: str
+    path: str
+    duration_ms: float
+    size_bytes: int
@@ -1,11 +1,42 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 class Token(BaseModel):
     access_token: str
     token_type: str
+    expires_in: int | None = None
+    refresh_token: str | None = None
+
+
+class RefreshTokenRequest(BaseModel):
+    refresh_token: str
 
 
 class TokenData(BaseModel):
     user_id: int | None = None
     username: str | None = None
     roles: str | None = None
+    family_id: str | None = None
+
+
+class IntrospectionRequest(BaseModel):
+    tokens: list[str] = Field(default_factory=list)
+    user_ids: list[int] = Field(default_factory=list)
+
+
+class TokenIntrospection(BaseModel):
+    active: bool
+    claims: dict | None = None
+    roles: str | None = None
+
+
+class UserIntrospection(BaseModel):
+    user_id: int
+    active: bool
+    username: str | None = None
+    roles: str | None = None
+
+
+class IntrospectionResponse(BaseModel):
+    # In the same order as the request
+    tokens: list[TokenIntrospection]
+    users: list[UserIntrospection]
@@ -0,0 +1,99 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+from fastapi import HTTPException, status
+from app.config import settings
+from app.utils.metrics import ADMISSION_IN_FLIGHT, ADMISSION_QUEUE_DEPTH, ADMISSION_REJECTED, ADMISSION_WAIT_SECONDS
+
+ADMISSION_MAX_CONCURRENT = settings.admission_max_concurrent or settings.password_hash_workers * 2
+ADMISSION_MAX_QUEUE = settings.admission_max_queue
+ADMISSION_QUEUE_TIMEOUT_SECONDS = settings.admission_queue_timeout_seconds
+ADMISSION_RETRY_AFTER_SECONDS = settings.admission_retry_after_seconds
+
+###################################################
+# Admission Controller
+###################################################
+
+class AdmissionController:
+    """
+    Caps how many expensive (bcrypt-bound) requests a worker runs at once.
+
+    Up to max_queue more wait for a slot for at most queue_timeout seconds;
+    anything beyond that is rejected straight away with 503 and Retry-After, so
+    a login spike cannot starve cheap routes of the event loop and database.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = ADMISSION_MAX_CONCURRENT,
+        max_queue: int = ADMISSION_MAX_QUEUE,
+        queue_timeout: float = ADMISSION_QUEUE_TIMEOUT_SECONDS,
+        retry_after: int = ADMISSION_RETRY_AFTER_SECONDS,
+    ):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+
+    def _reject(self, reason: str) -> HTTPException:
+        self.rejected += 1
+        ADMISSION_REJECTED.labels(reason).inc()
+        return HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is busy, try again later",
+            headers={"Retry-After": str(self.retry_after)},
+        )
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        if self._semaphore.locked():
+            if self.waiting >= self.max_queue:
+                raise self._reject("queue_full")
+            self.waiting += 1
+            ADMISSION_QUEUE_DEPTH.inc()
+            started = time.perf_counter()
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                raise self._reject("queue_timeout")
+            finally:
+                self.waiting -= 1
+                ADMISSION_QUEUE_DEPTH.dec()
+            ADMISSION_WAIT_SECONDS.observe(time.perf_counter() - started)
+        else:
+            await self._semaphore.acquire()
+            ADMISSION_WAIT_SECONDS.observe(0)
+
+        self.in_flight += 1
+        self.admitted += 1
+        ADMISSION_IN_FLIGHT.inc()
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            ADMISSION_IN_FLIGHT.dec()
+            self._semaphore.release()
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+        }
+
+
+admission_controller = AdmissionController()
+
+async def admit_expensive() -> AsyncIterator[None]:
+    """Route dependency that holds an admission slot for the rest of the request."""
+    async with admission_controller.slot():
+        yield
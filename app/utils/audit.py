@@ -0,0 +1,153 @@
+import asyncio
+import logging
+import time
+from typing import List, Optional
+from app.config import settings
+from app.db.config import AsyncSessionLocal
+from app.db.audit.access import AsyncAuditRepository
+from app.db.audit.models import AuditEventCreate
+from app.db.tokens.access import utcnow
+from app.utils.metrics import AUDIT_BUFFER_DEPTH, AUDIT_EVENTS, AUDIT_FLUSH_SECONDS
+
+AUDIT_BATCH_SIZE = settings.audit_batch_size
+AUDIT_FLUSH_INTERVAL_SECONDS = settings.audit_flush_interval_seconds
+AUDIT_MAX_BUFFER = settings.audit_max_buffer
+
+logger = logging.getLogger(__name__)
+
+###################################################
+# Audit Writer
+###################################################
+
+class AuditWriter:
+    """
+    Buffers audit events in memory and writes them from a background task in
+    batches, as soon as batch_size events are waiting or every flush_interval.
+
+    Recording never touches the database, so request latency does not depend
+    on audit writes. At most max_buffer events are held per worker: past that,
+    new events are dropped and counted, and a batch that fails to write is
+    kept for the next attempt only while there is room for it.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = AUDIT_BATCH_SIZE,
+        flush_interval: float = AUDIT_FLUSH_INTERVAL_SECONDS,
+        max_buffer: int = AUDIT_MAX_BUFFER,
+    ):
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self._buffer: List[AuditEventCreate] = []
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        # One flush at a time, so batches are written in the order they were recorded
+        self._flush_lock = asyncio.Lock()
+        self.written = 0
+        self.dropped = 0
+        self.failed_flushes = 0
+
+    def start(self) -> None:
+        if self._task is not None:
+            return
+        self._stopping = False
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Writes out everything buffered, giving up after timeout seconds."""
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wake.set()
+        try:
+            await asyncio.wait_for(self._task, timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._task = None
+        if self._buffer:
+            logger.warning("Dropping %d audit events on shutdown", len(self._buffer))
+            AUDIT_BUFFER_DEPTH.dec(len(self._buffer))
+            self._drop(len(self._buffer))
+            self._buffer = []
+
+    def record(
+        self,
+        event: str,
+        user_id: Optional[int] = None,
+        actor_id: Optional[int] = None,
+        username: Optional[str] = None,
+        ip: Optional[str] = None,
+    ) -> bool:
+        """Buffers an event without blocking; returns False when the buffer is full."""
+        if self._task is None:
+            self.start()
+        if len(self._buffer) >= self.max_buffer:
+            self._drop(1)
+            return False
+        self._buffer.append(AuditEventCreate(event=event, created_at=utcnow(), user_id=user_id, actor_id=actor_id, username=username, ip=ip))
+        AUDIT_BUFFER_DEPTH.inc()
+        if len(self._buffer) >= self.batch_size:
+            self._wake.set()
+        return True
+
+    async def _run(self) -> None:
+        # Checked after flushing, so a stop requested before the first run still drains the buffer
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+            if self._stopping:
+                return
+
+    async def flush(self) -> None:
+        async with self._flush_lock:
+            await self._flush()
+
+    async def _flush(self) -> None:
+        while self._buffer:
+            batch = self._buffer[:self.batch_size]
+            del self._buffer[:self.batch_size]
+            AUDIT_BUFFER_DEPTH.dec(len(batch))
+            started = time.perf_counter()
+            try:
+                async with AsyncSessionLocal() as db:
+                    await AsyncAuditRepository(db).write_events(batch)
+            except Exception:
+                self.failed_flushes += 1
+                logger.exception("Writing %d audit events failed; retrying on the next flush", len(batch))
+                # Events recorded meanwhile are newer, so the failed batch goes back in front of them
+                kept = batch[:max(0, self.max_buffer - len(self._buffer))]
+                self._buffer[:0] = kept
+                AUDIT_BUFFER_DEPTH.inc(len(kept))
+                self._drop(len(batch) - len(kept))
+                return
+            AUDIT_FLUSH_SECONDS.observe(time.perf_counter() - started)
+            AUDIT_EVENTS.labels("written").inc(len(batch))
+            self.written += len(batch)
+
+    def _drop(self, count: int) -> None:
+        if count:
+            self.dropped += count
+            AUDIT_EVENTS.labels("dropped").inc(count)
+
+    def stats(self) -> dict:
+        return {
+            "buffered": len(self._buffer),
+            "max_buffer": self.max_buffer,
+            "batch_size": self.batch_size,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed_flushes": self.failed_flushes,
+        }
+
+
+audit_log = AuditWriter()
+
+def record_event(event: str, user_id: Optional[int] = None, actor_id: Optional[int] = None, username: Optional[str] = None, ip: Optional[str] = None) -> bool:
+    return audit_log.record(event, user_id=user_id, actor_id=actor_id, username=username, ip=ip)
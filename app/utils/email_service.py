@@ -1,40 +1,228 @@
-import boto3
-from botocore.exceptions import ClientError
+import asyncio
+import itertools
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass
+from email.message import EmailMessage as MIMEMessage
+from pathlib import Path
+from typing import Dict, List, Optional
+from app.config import settings
+from app.utils.metrics import EMAIL_QUEUE_DEPTH, EMAIL_SEND_SECONDS
 
-from dotenv import load_dotenv
-import os
+SES_SENDER = settings.ses_sender
+SES_REGION = settings.ses_region
 
-load_dotenv()
-SES_SENDER = os.getenv("SES_SENDER")
+# "ses" (default), "file" (writes .eml files to EMAIL_OUTBOX_DIR) or "stub" (keeps messages in memory)
+EMAIL_TRANSPORT = settings.email_transport
+EMAIL_OUTBOX_DIR = settings.email_outbox_dir
+EMAIL_QUEUE_SIZE = settings.email_queue_size
+EMAIL_CONCURRENCY = settings.email_concurrency
+EMAIL_MAX_RETRIES = settings.email_max_retries
+EMAIL_RETRY_BACKOFF_SECONDS = settings.email_retry_backoff_seconds
 
-def send_email(recipient, subject, body_text):
-    #print("Sending email from {} to {} with subject: {}".format(SES_SENDER, recipient, subject))
+CHARSET = "UTF-8"
 
-    AWS_REGION = "sa-east-1"
-    CHARSET = "UTF-8"
-    client = boto3.client('ses',region_name=AWS_REGION)
-    try:
-        response = client.send_email(
+logger = logging.getLogger(__name__)
+
+@dataclass
+class EmailMessage:
+    recipient: str
+    subject: str
+    body_text: str
+
+###################################################
+# Transports
+###################################################
+
+class SESTransport:
+    def __init__(self, region: str = SES_REGION, sender: Optional[str] = SES_SENDER):
+        self.region = region
+        self.sender = sender
+        self._client = None
+
+    @property
+    def client(self):
+        # boto3 is slow to import and clients are expensive; build one and share it
+        if self._client is None:
+            import boto3
+            self._client = boto3.client('ses', region_name=self.region)
+        return self._client
+
+    def _send(self, message: EmailMessage) -> None:
+        self.client.send_email(
             Destination={
                 'ToAddresses': [
-                    recipient,
+                    message.recipient,
                 ],
             },
             Message={
                 'Body': {
                     'Text': {
                         'Charset': CHARSET,
-                        'Data': body_text,
+                        'Data': message.body_text,
                     },
                 },
                 'Subject': {
                     'Charset': CHARSET,
-                    'Data': subject,
+                    'Data': message.subject,
                 },
             },
-            Source=SES_SENDER,
+            Source=self.sender,
         )
-    except ClientError as e:
-        return False
-    else:
+
+    async def send(self, message: EmailMessage) -> None:
+        await asyncio.to_thread(self._send, message)
+
+
+class FileTransport:
+    def __init__(self, outbox_dir: str = EMAIL_OUTBOX_DIR, sender: Optional[str] = SES_SENDER):
+        self.outbox_dir = Path(outbox_dir)
+        self.sender = sender
+        self._counter = itertools.count()
+
+    def _send(self, message: EmailMessage) -> None:
+        mime = MIMEMessage()
+        mime["From"] = self.sender or "noreply@localhost"
+        mime["To"] = message.recipient
+        mime["Subject"] = message.subject
+        mime.set_content(message.body_text, charset=CHARSET)
+        self.outbox_dir.mkdir(parents=True, exist_ok=True)
+        path = self.outbox_dir / f"{time.time_ns()}-{next(self._counter)}.eml"
+        path.write_bytes(mime.as_bytes())
+
+    async def send(self, message: EmailMessage) -> None:
+        await asyncio.to_thread(self._send, message)
+
+
+class StubTransport:
+    def __init__(self, keep: int = 1000):
+        self.sent: deque = deque(maxlen=keep)
+
+    async def send(self, message: EmailMessage) -> None:
+        self.sent.append(message)
+
+
+def build_transport(kind: str = EMAIL_TRANSPORT):
+    if kind == "file":
+        return FileTransport()
+    if kind == "stub":
+        return StubTransport()
+    return SESTransport()
+
+###################################################
+# Dispatcher
+###################################################
+
+class EmailDispatcher:
+    """
+    Sends email from a bounded in-process queue drained by a fixed number of workers.
+
+    Messages queued under the same coalesce key while an earlier one is still
+    waiting replace it, so a burst of reset requests for one address sends one
+    email containing the newest link.
+    """
+
+    def __init__(
+        self,
+        transport=None,
+        queue_size: int = EMAIL_QUEUE_SIZE,
+        concurrency: int = EMAIL_CONCURRENCY,
+        max_retries: int = EMAIL_MAX_RETRIES,
+        retry_backoff: float = EMAIL_RETRY_BACKOFF_SECONDS,
+    ):
+        self.transport = transport if transport is not None else build_transport()
+        self.queue_size = queue_size
+        self.concurrency = max(1, concurrency)
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self._queue: Optional[asyncio.Queue] = None
+        self._pending: Dict[object, EmailMessage] = {}
+        self._workers: List[asyncio.Task] = []
+        self._ids = itertools.count()
+        self.sent = 0
+        self.failed = 0
+        self.coalesced = 0
+        self.rejected = 0
+
+    def start(self) -> None:
+        if self._workers:
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        if not self._workers:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Dropping %d queued emails on shutdown", self._queue.qsize())
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def enqueue(self, recipient: str, subject: str, body_text: str, coalesce_key: Optional[object] = None) -> bool:
+        """Queues a message without blocking; returns False when the queue is full."""
+        if self._queue is None:
+            self.start()
+        message = EmailMessage(recipient=recipient, subject=subject, body_text=body_text)
+        if coalesce_key is not None and coalesce_key in self._pending:
+            self._pending[coalesce_key] = message
+            self.coalesced += 1
+            return True
+
+        key = coalesce_key if coalesce_key is not None else next(self._ids)
+        try:
+            self._queue.put_nowait(key)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            return False
+        self._pending[key] = message
+        EMAIL_QUEUE_DEPTH.inc()
         return True
+
+    async def _worker(self) -> None:
+        while True:
+            key = await self._queue.get()
+            EMAIL_QUEUE_DEPTH.dec()
+            try:
+                message = self._pending.pop(key)
+                await self._deliver(message)
+            finally:
+                self._queue.task_done()
+
+    async def _deliver(self, message: EmailMessage) -> None:
+        for attempt in range(self.max_retries + 1):
+            started = time.perf_counter()
+            try:
+                await self.transport.send(message)
+            except Exception:
+                EMAIL_SEND_SECONDS.labels("error").observe(time.perf_counter() - started)
+                if attempt == self.max_retries:
+                    self.failed += 1
+                    logger.exception("Giving up sending email after %d attempts", attempt + 1)
+                    return
+                await asyncio.sleep(self.retry_backoff * 2 ** attempt)
+            else:
+                EMAIL_SEND_SECONDS.labels("sent").observe(time.perf_counter() - started)
+                self.sent += 1
+                return
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "queue_size": self.queue_size,
+            "concurrency": self.concurrency,
+            "sent": self.sent,
+            "failed": self.failed,
+            "coalesced": self.coalesced,
+            "rejected": self.rejected,
+        }
+
+
+email_dispatcher = EmailDispatcher()
+
+def queue_email(recipient: str, subject: str, body_text: str, coalesce_key: Optional[object] = None) -> bool:
+    return email_dispatcher.enqueue(recipient, subject, body_text, coalesce_key=coalesce_key)
@@ -0,0 +1,114 @@
+import functools
+import time
+from typing import Callable
+# Imported first: it exports PROMETHEUS_MULTIPROC_DIR from .env before prometheus_client picks its value class
+from app.config import settings
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest
+from prometheus_client import multiprocess
+
+# Sub-millisecond buckets for cache-backed paths up to multi-second bcrypt and SES calls
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+###################################################
+# Metrics
+###################################################
+
+PASSWORD_HASH_SECONDS = Histogram(
+    "password_hash_seconds", "bcrypt work including time queued for a pool worker",
+    ["operation"], buckets=LATENCY_BUCKETS,
+)
+PASSWORD_HASH_IN_FLIGHT = Gauge(
+    "password_hash_in_flight", "bcrypt operations submitted to the pool and not yet finished",
+    multiprocess_mode="livesum",
+)
+REPOSITORY_QUERY_SECONDS = Histogram(
+    "repository_query_seconds", "Users, tokens and audit repository method latency",
+    ["method"], buckets=LATENCY_BUCKETS,
+)
+JWT_SECONDS = Histogram(
+    "jwt_seconds", "Access token signing and verification time",
+    ["operation"], buckets=LATENCY_BUCKETS,
+)
+EMAIL_SEND_SECONDS = Histogram(
+    "email_send_seconds", "Email transport latency per attempt",
+    ["outcome"], buckets=LATENCY_BUCKETS,
+)
+EMAIL_QUEUE_DEPTH = Gauge(
+    "email_queue_depth", "Emails waiting to be sent",
+    multiprocess_mode="livesum",
+)
+ADMISSION_QUEUE_DEPTH = Gauge(
+    "admission_queue_depth", "Expensive requests waiting for an admission slot",
+    multiprocess_mode="livesum",
+)
+ADMISSION_IN_FLIGHT = Gauge(
+    "admission_in_flight", "Expensive requests holding an admission slot",
+    multiprocess_mode="livesum",
+)
+ADMISSION_WAIT_SECONDS = Histogram(
+    "admission_wait_seconds", "Time expensive requests waited for an admission slot",
+    buckets=LATENCY_BUCKETS,
+)
+ADMISSION_REJECTED = Counter(
+    "admission_rejected_total", "Expensive requests shed with 503",
+    ["reason"],
+)
+DB_POOL_CHECKOUT_SECONDS = Histogram(
+    "db_pool_checkout_seconds", "Time spent waiting for a pooled database connection",
+    ["pool"], buckets=LATENCY_BUCKETS,
+)
+DB_POOL_TIMEOUTS = Counter(
+    "db_pool_timeouts_total", "Connection checkouts that gave up after the pool timeout",
+    ["pool"],
+)
+DB_POOL_IN_USE = Gauge(
+    "db_pool_connections_in_use", "Pooled connections checked out",
+    ["pool"], multiprocess_mode="livesum",
+)
+DB_POOL_IDLE = Gauge(
+    "db_pool_connections_idle", "Pooled connections open and waiting to be checked out",
+    ["pool"], multiprocess_mode="livesum",
+)
+DB_READS = Counter(
+    "db_reads_total", "User reads by the database they were served from",
+    ["target"],
+)
+AUDIT_BUFFER_DEPTH = Gauge(
+    "audit_buffer_depth", "Audit events waiting to be written",
+    multiprocess_mode="livesum",
+)
+AUDIT_EVENTS = Counter(
+    "audit_events_total", "Audit events by what became of them",
+    ["outcome"],
+)
+AUDIT_FLUSH_SECONDS = Histogram(
+    "audit_flush_seconds", "Time to write one batch of audit events",
+    buckets=LATENCY_BUCKETS,
+)
+AUTH_FAILURES = Counter(
+    "auth_failures_total", "Rejected authentication attempts",
+    ["reason"],
+)
+
+def timed(histogram: Histogram, label: str) -> Callable:
+    """Observes the duration of an async function under the given label."""
+    observe = histogram.labels(label).observe
+
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                observe(time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+def render_metrics() -> bytes:
+    # With several uvicorn/gunicorn workers, PROMETHEUS_MULTIPROC_DIR aggregates all of them
+    if settings.prometheus_multiproc_dir:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
@@ -0,0 +1,151 @@
+import asyncio
+import cProfile
+import hmac
+import io
+import logging
+import os
+import pstats
+import random
+import re
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List, Optional
+from urllib.parse import quote, unquote
+from app.config import settings
+from app.schemas.profile import ProfileInfo
+
+PROFILING_DIR = settings.profiling_dir
+PROFILING_MAX_FILES = settings.profiling_max_files
+PROFILING_SAMPLE_RATE = settings.profiling_sample_rate
+PROFILING_TOKEN = settings.profiling_token
+# The middleware is only installed when something can select a request
+PROFILING_ENABLED = PROFILING_SAMPLE_RATE > 0 or bool(PROFILING_TOKEN)
+
+PROFILE_HEADER = b"x-profile-token"
+PROFILE_ID_HEADER = b"x-profile-id"
+
+# Files are named <created ns>-<pid>_<method>_<duration us>_<quoted path>.pstats; the first part is the profile id
+_PROFILE_ID = re.compile(r"^\d+-\d+$")
+_PROFILE_FILE = re.compile(r"^((\d+)-\d+)_([A-Z]+)_(\d+)_([A-Za-z0-9%._~-]*)$")
+
+logger = logging.getLogger(__name__)
+
+###################################################
+# Profile Store
+###################################################
+
+class ProfileStore:
+    """Keeps the newest max_files pstats dumps in one directory."""
+
+    def __init__(self, directory: str = PROFILING_DIR, max_files: int = PROFILING_MAX_FILES):
+        self.directory = Path(directory)
+        self.max_files = max(1, max_files)
+
+    @staticmethod
+    def new_id() -> str:
+        return f"{time.time_ns()}-{os.getpid()}"
+
+    def save(self, profile_id: str, profiler: cProfile.Profile, method: str, path: str, duration: float) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        profiler.dump_stats(self.directory / f"{profile_id}_{method}_{int(duration * 1_000_000)}_{quote(path, safe='')[:160]}.pstats")
+        self.prune()
+
+    def prune(self) -> None:
+        # Ids start with the creation time, so name order is age order
+        files = sorted(self.directory.glob("*.pstats"))
+        for stale in files[:max(0, len(files) - self.max_files)]:
+            stale.unlink(missing_ok=True)
+
+    def path_for(self, profile_id: str) -> Optional[Path]:
+        # Only well-formed ids are turned into paths, so nothing outside the directory is reachable
+        if not _PROFILE_ID.match(profile_id):
+            return None
+        return next(self.directory.glob(f"{profile_id}_*.pstats"), None)
+
+    def list(self) -> List[ProfileInfo]:
+        if not self.directory.is_dir():
+            return []
+        profiles = []
+        for path in sorted(self.directory.glob("*.pstats"), reverse=True):
+            match = _PROFILE_FILE.match(path.stem)
+            if match is None:
+                continue
+            profile_id, created_ns, method, duration_us, quoted_path = match.groups()
+            profiles.append(ProfileInfo(
+                profile_id=profile_id,
+                created_at=datetime.fromtimestamp(int(created_ns) / 1e9, timezone.utc).isoformat(),
+                method=method,
+                path=unquote(quoted_path),
+                duration_ms=int(duration_us) / 1000,
+                size_bytes=path.stat().st_size,
+            ))
+        return profiles
+
+    def summary(self, profile_id: str, sort: str = "cumulative", limit: int = 50) -> Optional[str]:
+        path = self.path_for(profile_id)
+        if path is None:
+            return None
+        output = io.StringIO()
+        pstats.Stats(str(path), stream=output).sort_stats(sort).print_stats(limit)
+        return output.getvalue()
+
+
+profile_store = ProfileStore()
+
+###################################################
+# Middleware
+###################################################
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware that runs cProfile over selected requests and stores the
+    result; the profile id is returned in the X-Profile-Id response header.
+
+    A request is selected when it carries X-Profile-Token matching
+    PROFILING_TOKEN, or at random with probability PROFILING_SAMPLE_RATE.
+    cProfile follows the whole event loop thread, so other requests that run
+    while a profile is being taken appear in it too; to keep that bounded only
+    one request per worker is profiled at a time and the rest pass straight
+    through. Work in the bcrypt pool shows up as time awaiting the executor.
+    """
+
+    def __init__(self, app, store: ProfileStore = profile_store, sample_rate: float = PROFILING_SAMPLE_RATE, token: Optional[str] = PROFILING_TOKEN):
+        self.app = app
+        self.store = store
+        self.sample_rate = sample_rate
+        self.token = token.encode() if token else None
+        self._active = False
+
+    def _selected(self, scope) -> bool:
+        if self.token is not None:
+            for name, value in scope["headers"]:
+                if name == PROFILE_HEADER:
+                    return hmac.compare_digest(value, self.token)
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self._active or not self._selected(scope):
+            await self.app(scope, receive, send)
+            return
+
+        self._active = True
+        profile_id = self.store.new_id()
+
+        async def send_with_id(message) -> None:
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", []), (PROFILE_ID_HEADER, profile_id.encode())]
+            await send(message)
+
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        profiler.enable()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            profiler.disable()
+            self._active = False
+            try:
+                await asyncio.to_thread(self.store.save, profile_id, profiler, scope["method"], scope["path"], time.perf_counter() - started)
+            except OSError:
+                logger.exception("Storing a request profile failed")
@@ -1,10 +1,10 @@
 from http.client import HTTPException
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
-import os
+from app.config import settings
 
-RESET_PASSWORD_SECRET_KEY = os.getenv("RESET_PASSWORD_SECRET_KEY")
-RESET_PASSWORD_SECRET_KEY_ALGORITHM = os.getenv("RESET_PASSWORD_SECRET_KEY_ALGORITHM")
+RESET_PASSWORD_SECRET_KEY = settings.reset_password_secret_key
+RESET_PASSWORD_SECRET_KEY_ALGORITHM = settings.reset_password_secret_key_algorithm
 
 def create_reset_password_token(data: dict, expires_delta: timedelta):
     to_encode = data.copy()
@@ -0,0 +1,23 @@
+from typing import Any
+import orjson
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+
+
+def _model_fields(value: Any) -> Any:
+    # A pydantic model's __dict__ holds exactly its field values, already validated
+    if isinstance(value, BaseModel):
+        return value.__dict__
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class ModelJSONResponse(ORJSONResponse):
+    """
+    ORJSONResponse that also serializes pydantic models directly.
+
+    Endpoints return it with validated models as content, so FastAPI skips its
+    response_model validation pass and orjson writes the fields in one go.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=_model_fields, option=orjson.OPT_NON_STR_KEYS)
@@ -0,0 +1,90 @@
+"""
+Cold-start measurement for scale-to-zero deployments.
+
+Times, over several fresh interpreter processes, how long `import app.main`
+takes and how long uvicorn needs from spawn to its first successful response:
+
+    python -m bench.cold_start --runs 5 --output cold_start.json
+
+Environment is taken from the caller, with the benchmark defaults filled in.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List
+import httpx
+from bench.run import BENCH_ENV, free_port, percentile, seed_users
+
+IMPORT_SNIPPET = "import time; started = time.perf_counter(); import app.main; print(time.perf_counter() - started)"
+
+
+def measure_import() -> float:
+    output = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], check=True, capture_output=True, text=True, env=os.environ.copy())
+    return float(output.stdout.strip().splitlines()[-1])
+
+
+def measure_first_response(timeout: float = 60.0) -> float:
+    port = free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        env=os.environ.copy(),
+    )
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=5) as client:
+            while time.perf_counter() - started < timeout:
+                try:
+                    if client.get("/.well-known/jwks.json").status_code == 200:
+                        return time.perf_counter() - started
+                except httpx.TransportError:
+                    pass
+                time.sleep(0.005)
+        raise RuntimeError("Server did not become ready")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def summarize(samples: List[float]) -> dict:
+    ordered = sorted(samples)
+    return {
+        "runs": len(ordered),
+        "min_ms": ordered[0] * 1000,
+        "p50_ms": percentile(ordered, 0.50) * 1000,
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure import and first-response time of the API.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--database-url", help="SQLAlchemy async URL; defaults to a temporary SQLite database")
+    parser.add_argument("--output", help="write results JSON to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.update({key: value for key, value in BENCH_ENV.items() if key not in os.environ})
+        os.environ["DATABASE_URL"] = args.database_url or f"sqlite+aiosqlite:///{tmp}/cold_start.db"
+        # Startup reads the revocation list, so the schema has to exist
+        asyncio.run(seed_users("cold-start", 0))
+        results = {
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "environment": {"python": platform.python_version(), "platform": platform.platform()},
+            "import": summarize([measure_import() for _ in range(args.runs)]),
+            "first_response": summarize([measure_first_response() for _ in range(args.runs)]),
+        }
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+-- Refresh-token families and the revocation log polled by every API worker
+
+create table if not exists refresh_tokens
+(
+    token_hash varchar(64) primary key,
+    family_id  varchar(32) not null,
+    user_id    integer     not null references users (user_id) on delete cascade,
+    created_at timestamp   not null default now(),
+    expires_at timestamp   not null,
+    used_at    timestamp,
+    revoked_at timestamp
+);
+
+create index if not exists ix_refresh_tokens_family_id on refresh_tokens (family_id);
+create index if not exists ix_refresh_tokens_user_id on refresh_tokens (user_id);
+
+create table if not exists token_revocations
+(
+    id         serial primary key,
+    jti        varchar(32) not null,
+    expires_at timestamp   not null,
+    created_at timestamp   not null default now()
+);
+
+create index if not exists ix_token_revocations_created_at on token_revocations (created_at);
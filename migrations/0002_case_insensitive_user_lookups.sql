@@ -0,0 +1,7 @@
+-- Case-insensitive email/username lookups (lower(...) = lower(:value)) use these indexes.
+-- Creating them fails if two users differ only by case; merge or rename those first:
+--   select lower(email), count(*) from users group by 1 having count(*) > 1;
+--   select lower(username), count(*) from users group by 1 having count(*) > 1;
+
+create unique index concurrently if not exists ix_users_email_lower on users (lower(email));
+create unique index concurrently if not exists ix_users_username_lower on users (lower(username));
@@ -0,0 +1,20 @@
+-- Audit trail and login bookkeeping, written in batches by app/utils/audit.py.
+-- Adding a column with a constant default does not rewrite users on Postgres 11+.
+
+create table if not exists audit_events
+(
+    id         bigserial primary key,
+    event      varchar(32) not null,
+    user_id    integer,
+    actor_id   integer,
+    username   varchar,
+    ip         varchar(45),
+    created_at timestamp   not null
+);
+
+create index if not exists ix_audit_events_created_at on audit_events (created_at);
+create index if not exists ix_audit_events_user_id_created_at on audit_events (user_id, created_at);
+
+alter table users
+    add column if not exists last_login_at      timestamp,
+    add column if not exists failed_login_count integer not null default 0;
@@ -0,0 +1,80 @@
+import asyncio
+import itertools
+import os
+import tempfile
+from typing import Callable, Optional
+import pytest
+
+# Sends a real email through SES when imported; run it by hand
+collect_ignore = ["test_aws_ses.py"]
+
+_DATABASE_DIR = tempfile.mkdtemp(prefix="api-tests-")
+
+# Set before anything imports app.config, which reads the environment once
+os.environ.update({
+    "DATABASE_URL": f"sqlite+aiosqlite:///{_DATABASE_DIR}/test.db",
+    "SECRET_KEY": "test-secret",
+    "ALGORITHM": "HS256",
+    "RESET_PASSWORD_SECRET_KEY": "test-reset-secret",
+    "RESET_PASSWORD_SECRET_KEY_ALGORITHM": "HS256",
+    "FRONTEND_RESET_PASSWORD_URL": "http://localhost/reset",
+    "EMAIL_TRANSPORT": "stub",
+    "BCRYPT_ROUNDS": "4",
+    "LOGIN_MAX_ATTEMPTS_PER_USERNAME": "1000",
+    "LOGIN_MAX_ATTEMPTS_PER_IP": "1000000",
+})
+
+from fastapi.testclient import TestClient  # noqa: E402
+from app.db.config import AsyncSessionLocal, Base, dispose_engine, init_engine  # noqa: E402
+from app.db.users.access import AsyncUsersRepository  # noqa: E402
+from app.main import app  # noqa: E402
+
+PASSWORD = "test-password"
+_names = itertools.count()
+
+
+@pytest.fixture(scope="session")
+def client():
+    async def create_schema() -> None:
+        async with init_engine().begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+        await dispose_engine()
+
+    asyncio.run(create_schema())
+    # Entering the client runs the lifespan, so background tasks share the app's event loop
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+def auth(token: str) -> dict:
+    return {"Authorization": f"Bearer {token}"}
+
+
+def login(client: TestClient, username: str, password: str = PASSWORD) -> dict:
+    response = client.post("/token/", data={"username": username, "password": password})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+@pytest.fixture
+def make_user(client) -> Callable[..., dict]:
+    """Creates a user with a unique name and optional roles; returns it with a fresh login."""
+    def make(roles: Optional[str] = None) -> dict:
+        name = f"user{next(_names)}"
+        response = client.post("/api/v1/users/", json={"email": f"{name}@test.local", "username": name, "password": PASSWORD})
+        assert response.status_code == 200, response.text
+        user = response.json()
+        if roles is not None:
+            call_users_repo(client, "update_user_roles", user["user_id"], roles)
+        return {**user, **login(client, name)}
+
+    return make
+
+
+def call_users_repo(client: TestClient, method: str, *args):
+    """Calls a repository method on the app's event loop, with a session of its own."""
+    async def call():
+        async with AsyncSessionLocal() as db:
+            return await getattr(AsyncUsersRepository(db), method)(*args)
+
+    return client.portal.call(call)
@@ -0,0 +1,38 @@
+import asyncio
+import pytest
+from fastapi import HTTPException
+from app.utils.admission import AdmissionController, admission_controller
+from conftest import PASSWORD, auth
+
+
+def test_excess_requests_queue_then_shed():
+    controller = AdmissionController(max_concurrent=1, max_queue=1, queue_timeout=0.05, retry_after=7)
+
+    async def contend():
+        async with controller.slot():
+            waiting = asyncio.create_task(controller.slot().__aenter__())
+            await asyncio.sleep(0)
+            with pytest.raises(HTTPException) as queue_full:
+                async with controller.slot():
+                    pass
+            with pytest.raises(HTTPException) as queue_timeout:
+                await waiting
+        return queue_full.value, queue_timeout.value
+
+    for rejection in asyncio.run(contend()):
+        assert rejection.status_code == 503
+        assert rejection.headers == {"Retry-After": "7"}
+    assert controller.stats() == {"max_concurrent": 1, "max_queue": 1, "in_flight": 0, "waiting": 0, "admitted": 1, "rejected": 2}
+
+
+def test_saturated_worker_sheds_logins_but_serves_cheap_routes(client, make_user, monkeypatch):
+    user = make_user()
+    # Every slot taken and no room to queue
+    monkeypatch.setattr(admission_controller, "_semaphore", asyncio.Semaphore(0))
+    monkeypatch.setattr(admission_controller, "max_queue", 0)
+
+    response = client.post("/token/", data={"username": user["username"], "password": PASSWORD})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == str(admission_controller.retry_after)
+    assert client.post("/api/v1/users/", json={"email": "shed@test.local", "username": "shed", "password": PASSWORD}).status_code == 503
+    assert client.get(f"/api/v1/users/{user['user_id']}", headers=auth(user["access_token"])).status_code == 200
@@ -0,0 +1,44 @@
+from sqlalchemy import select
+from app.db.audit.models import LOGIN_FAILED, LOGIN_SUCCEEDED, USER_UPDATED, AuditEvent
+from app.db.config import AsyncSessionLocal
+from app.db.users.models import User
+from app.utils.audit import AuditWriter, audit_log
+from conftest import PASSWORD, auth
+
+
+async def audit_state(user_id: int):
+    async with AsyncSessionLocal() as db:
+        login = (await db.execute(select(User.last_login_at, User.failed_login_count).where(User.user_id == user_id))).one()
+        events = (await db.execute(select(AuditEvent.event).where(AuditEvent.user_id == user_id).order_by(AuditEvent.id))).scalars().all()
+    return login, events
+
+
+def test_flush_writes_events_and_login_state(client, make_user):
+    user = make_user()
+    for password in ("wrong", "wrong", PASSWORD, "wrong"):
+        client.post("/token/", data={"username": user["username"], "password": password})
+    client.put("/api/v1/users", json={"email": user["email"]}, headers=auth(user["access_token"]))
+
+    client.portal.call(audit_log.flush)
+    (last_login_at, failed_login_count), events = client.portal.call(audit_state, user["user_id"])
+    assert events == [LOGIN_SUCCEEDED, LOGIN_FAILED, LOGIN_FAILED, LOGIN_SUCCEEDED, LOGIN_FAILED, USER_UPDATED]
+    assert last_login_at is not None
+    # Failures since the last successful login
+    assert failed_login_count == 1
+
+
+def test_full_buffer_drops_new_events(client, make_user):
+    user = make_user()
+
+    async def record_and_stop():
+        writer = AuditWriter(batch_size=10, flush_interval=60, max_buffer=2)
+        recorded = [writer.record(LOGIN_FAILED, user_id=user["user_id"]) for _ in range(3)]
+        stats = writer.stats()
+        await writer.stop()
+        return recorded, stats, writer.stats()
+
+    recorded, buffered, stopped = client.portal.call(record_and_stop)
+    assert recorded == [True, True, False]
+    assert (buffered["buffered"], buffered["dropped"]) == (2, 1)
+    # Stopping drains the buffer
+    assert (stopped["buffered"], stopped["written"]) == (0, 2)
@@ -0,0 +1,63 @@
+import time
+from datetime import timedelta
+from app.auth.cache import PrincipalCache, TokenCache, principal_cache, token_cache
+from app.auth.logic import create_access_token, user_claims, verify_access_token
+from app.db.users.models import UserPublic
+from conftest import auth, call_users_repo
+
+
+def test_principal_cache_is_bounded():
+    cache = PrincipalCache(maxsize=2, ttl=60)
+    for user_id in (1, 2, 3):
+        cache.set(UserPublic(user_id=user_id, email=f"{user_id}@test.local", username=str(user_id), created_at="2024-01-01T00:00:00", roles="user"))
+    assert cache.get(1) is None
+    assert cache.get(3).username == "3"
+    assert cache.stats() == {"size": 2, "maxsize": 2, "hits": 1, "misses": 1}
+
+
+def test_profile_update_writes_through(client, make_user):
+    user = make_user()
+    response = client.put("/api/v1/users", json={"username": user["username"] + "-renamed"}, headers=auth(user["access_token"]))
+    assert response.status_code == 200
+    assert principal_cache.get(user["user_id"]).username == user["username"] + "-renamed"
+
+
+def test_role_change_writes_through(client, make_user):
+    user = make_user()
+    call_users_repo(client, "update_user_roles", user["user_id"], "user,service")
+    assert principal_cache.get(user["user_id"]).roles == "user,service"
+
+
+def test_delete_invalidates(client, make_user):
+    admin, user = make_user(roles="admin"), make_user()
+    # Loads the principal through get_current_user
+    client.put("/api/v1/users", json={"email": user["email"]}, headers=auth(user["access_token"]))
+    assert principal_cache.get(user["user_id"]) is not None
+
+    assert client.delete(f"/api/v1/users/{user['user_id']}", headers=auth(admin["access_token"])).status_code == 200
+    assert principal_cache.get(user["user_id"]) is None
+
+
+def test_token_cache_never_outlives_the_token():
+    cache = TokenCache(maxsize=10)
+    cache.set("expired", {"exp": time.time() - 1})
+    cache.set("valid", {"exp": time.time() + 60})
+    assert cache.get("expired") is None
+    assert cache.get("valid") is not None
+
+
+def test_token_cache_expires_with_the_token():
+    cache = TokenCache(maxsize=10)
+    cache.set("token", {"exp": time.time() + 0.05})
+    assert cache.get("token") is not None
+    time.sleep(0.1)
+    assert cache.get("token") is None
+
+
+def test_repeated_verification_hits_the_cache(client, make_user):
+    user = make_user()
+    token = create_access_token({"user": user_claims(call_users_repo(client, "get_user_public", user["user_id"]))}, timedelta(minutes=1))
+    misses, hits = token_cache.misses, token_cache.hits
+    verify_access_token(token)
+    verify_access_token(token)
+    assert (token_cache.misses - misses, token_cache.hits - hits) == (1, 1)
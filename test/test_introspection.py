@@ -0,0 +1,60 @@
+from sqlalchemy import event
+from app.auth.cache import principal_cache
+from app.db.config import init_engine
+from app.routers import token as token_router
+from conftest import auth, call_users_repo
+
+
+def introspect(client, caller: dict, tokens=(), user_ids=()):
+    return client.post("/token/introspect", json={"tokens": list(tokens), "user_ids": list(user_ids)}, headers=auth(caller["access_token"]))
+
+
+def test_results_follow_request_order(client, make_user):
+    admin, gateway = make_user(roles="admin"), make_user(roles="service")
+    user, revoked, deleted = make_user(), make_user(), make_user()
+    client.post("/token/revoke", json={"refresh_token": revoked["refresh_token"]})
+    client.delete(f"/api/v1/users/{deleted['user_id']}", headers=auth(admin["access_token"]))
+
+    tokens = [user["access_token"], "not-a-token", revoked["access_token"], deleted["access_token"]]
+    response = introspect(client, gateway, tokens, [deleted["user_id"], user["user_id"]])
+    assert response.status_code == 200
+    result = response.json()
+    assert [token["active"] for token in result["tokens"]] == [True, False, False, False]
+    assert result["tokens"][0]["claims"]["user"]["user_id"] == user["user_id"]
+    assert [(found["user_id"], found["active"], found["username"]) for found in result["users"]] == [
+        (deleted["user_id"], False, None),
+        (user["user_id"], True, user["username"]),
+    ]
+
+
+def test_roles_come_from_the_user_record(client, make_user):
+    gateway, user = make_user(roles="service"), make_user()
+    call_users_repo(client, "update_user_roles", user["user_id"], "user,service")
+    result = introspect(client, gateway, [user["access_token"]]).json()["tokens"][0]
+    assert result["claims"]["user"]["roles"] == "user"
+    assert result["roles"] == "user,service"
+
+
+def test_every_user_is_resolved_with_one_query(client, make_user):
+    gateway = make_user(roles="service")
+    users = [make_user() for _ in range(3)]
+    principal_cache.clear()
+    statements = []
+
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    engine = init_engine().sync_engine
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        response = introspect(client, gateway, [user["access_token"] for user in users], [user["user_id"] for user in users] + [10 ** 9])
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+    assert response.status_code == 200
+    assert len(statements) == 1
+
+
+def test_oversized_batches_are_rejected(client, make_user, monkeypatch):
+    gateway = make_user(roles="service")
+    monkeypatch.setattr(token_router, "INTROSPECTION_MAX_ITEMS", 2)
+    assert introspect(client, gateway, ["a", "b"], [1]).status_code == 413
@@ -0,0 +1,43 @@
+import asyncio
+import threading
+import time
+from app.auth import password
+from app.auth.password import HASH_MANY_CHUNK_SIZE, PasswordHasher
+
+
+def test_bulk_hashing_leaves_workers_for_logins(monkeypatch):
+    lock = threading.Lock()
+    running = {"bulk": 0, "max_bulk": 0}
+    chunk_sizes = []
+
+    def slow_hashes(passwords):
+        with lock:
+            running["bulk"] += 1
+            running["max_bulk"] = max(running["max_bulk"], running["bulk"])
+            chunk_sizes.append(len(passwords))
+        time.sleep(0.02)
+        with lock:
+            running["bulk"] -= 1
+        return [f"hashed-{value}" for value in passwords]
+
+    monkeypatch.setattr(password, "get_password_hashes", slow_hashes)
+    monkeypatch.setattr(password, "verify_password", lambda plain, hashed: plain == hashed)
+    hasher = PasswordHasher(workers=2, executor="thread", bulk_workers=1)
+    passwords = [str(index) for index in range(HASH_MANY_CHUNK_SIZE * 20)]
+
+    async def import_and_login():
+        bulk = asyncio.create_task(hasher.hash_many(passwords))
+        await asyncio.sleep(0.05)
+        verified = await hasher.verify("secret", "secret")
+        # The login was served by the free worker rather than queued behind the import
+        overtook = not bulk.done()
+        return verified, overtook, await bulk
+
+    try:
+        verified, overtook, hashed = asyncio.run(import_and_login())
+    finally:
+        hasher.shutdown()
+    assert verified and overtook
+    assert hashed == [f"hashed-{value}" for value in passwords]
+    assert running["max_bulk"] == 1
+    assert max(chunk_sizes) <= HASH_MANY_CHUNK_SIZE
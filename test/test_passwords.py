@@ -0,0 +1,27 @@
+from app.auth import password
+from app.auth.password import build_password_context, calibrate_rounds
+from conftest import PASSWORD, call_users_repo, login
+
+
+def stored_hash(client, username: str) -> str:
+    return call_users_repo(client, "get_user_credentials", username).hashed_password
+
+
+def test_login_upgrades_a_hash_with_another_cost(client, make_user):
+    user = make_user()
+    outdated = build_password_context(5).hash(PASSWORD)
+    assert password.pwd_context.needs_update(outdated)
+    call_users_repo(client, "update_password_hash", user["user_id"], outdated)
+
+    login(client, user["username"])
+    upgraded = stored_hash(client, user["username"])
+    assert upgraded.startswith("$2b$04$")
+    assert not password.pwd_context.needs_update(upgraded)
+    # The upgraded hash still verifies
+    login(client, user["username"])
+    assert stored_hash(client, user["username"]) == upgraded
+
+
+def test_calibration_stays_within_bounds():
+    assert calibrate_rounds(0, min_rounds=4, max_rounds=6) == 4
+    assert calibrate_rounds(10 ** 9, min_rounds=4, max_rounds=6) == 6
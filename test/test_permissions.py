@@ -0,0 +1,54 @@
+import inspect
+import pytest
+from app.auth.logic import create_access_token
+from app.auth.permissions import Permission, permissions_for_roles, require_permissions
+from conftest import auth
+
+
+def test_roles_compile_to_permissions():
+    assert permissions_for_roles("user") == Permission.USERS_READ
+    assert permissions_for_roles("User, service") & Permission.TOKENS_INTROSPECT
+    assert permissions_for_roles("unknown") == Permission(0)
+
+
+def test_dependency_runs_on_the_event_loop():
+    # A plain def would be run in the threadpool, sharing the token cache across threads
+    assert inspect.iscoroutinefunction(require_permissions(Permission.USERS_READ))
+
+
+def test_missing_or_invalid_tokens_are_unauthorized(client, make_user):
+    user = make_user()
+    path = f"/api/v1/users/{user['user_id']}"
+    assert client.get(path).status_code == 401
+    assert client.get(path, headers=auth("not-a-token")).status_code == 401
+    # Validly signed, but without the user claim every route relies on
+    assert client.get(path, headers=auth(create_access_token({"sub": "someone"}))).status_code == 401
+
+
+@pytest.mark.parametrize("method, path", [
+    ("DELETE", "/api/v1/users/{user_id}"),
+    ("GET", "/api/v1/users/export"),
+    ("GET", "/api/v1/users/"),
+    ("POST", "/token/introspect"),
+    ("GET", "/profiles"),
+])
+def test_default_role_is_forbidden_from_admin_routes(client, make_user, method, path):
+    user = make_user()
+    kwargs = {"json": {"tokens": []}} if method == "POST" else {}
+    response = client.request(method, path.format(user_id=user["user_id"]), headers=auth(user["access_token"]), **kwargs)
+    assert response.status_code == 403
+
+
+def test_roles_grant_their_permissions(client, make_user):
+    admin, service, user = make_user(roles="admin"), make_user(roles="service"), make_user()
+
+    assert client.post("/token/introspect", json={"tokens": [user["access_token"]]}, headers=auth(service["access_token"])).status_code == 200
+    assert client.get("/api/v1/users/", headers=auth(service["access_token"])).status_code == 200
+    assert client.delete(f"/api/v1/users/{user['user_id']}", headers=auth(service["access_token"])).status_code == 403
+    assert client.delete(f"/api/v1/users/{user['user_id']}", headers=auth(admin["access_token"])).status_code == 200
+
+
+def test_revoked_token_is_unauthorized_even_with_permission(client, make_user):
+    admin = make_user(roles="admin")
+    assert client.post("/token/revoke", json={"refresh_token": admin["refresh_token"]}).status_code == 204
+    assert client.get("/api/v1/users/export", headers=auth(admin["access_token"])).status_code == 401
@@ -0,0 +1,39 @@
+import asyncio
+from app.auth.throttle import InMemoryThrottleBackend, LoginThrottle, LOGIN_THROTTLE_WINDOW_SECONDS, login_throttle
+from conftest import PASSWORD
+
+
+def attempt(client, username: str, password: str):
+    return client.post("/token/", data={"username": username, "password": password})
+
+
+def test_repeated_failures_get_429_with_retry_after(client, make_user, monkeypatch):
+    user = make_user()
+    monkeypatch.setattr(login_throttle, "max_per_username", 2)
+    assert [attempt(client, user["username"], "wrong").status_code for _ in range(2)] == [401, 401]
+
+    response = attempt(client, user["username"].upper(), PASSWORD)
+    assert response.status_code == 429
+    assert 1 <= int(response.headers["Retry-After"]) <= LOGIN_THROTTLE_WINDOW_SECONDS
+
+
+def test_successful_login_resets_the_username_counter(client, make_user, monkeypatch):
+    user = make_user()
+    monkeypatch.setattr(login_throttle, "max_per_username", 2)
+    assert attempt(client, user["username"], "wrong").status_code == 401
+    assert attempt(client, user["username"], PASSWORD).status_code == 200
+    assert attempt(client, user["username"], "wrong").status_code == 401
+    assert attempt(client, user["username"], PASSWORD).status_code == 200
+
+
+def test_attempts_are_counted_per_ip_across_usernames():
+    throttle = LoginThrottle(backend=InMemoryThrottleBackend(window=60), max_per_username=10, max_per_ip=3)
+
+    async def attempts():
+        return [await throttle.hit(f"user{index}", "10.0.0.1") for index in range(4)] + [await throttle.hit("user9", "10.0.0.2")]
+
+    results = asyncio.run(attempts())
+    assert results[:3] == [None, None, None]
+    assert 1 <= results[3] <= 60
+    assert results[4] is None
+    assert throttle.throttled == 1
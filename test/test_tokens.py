@@ -0,0 +1,61 @@
+from datetime import timedelta
+from app.utils.reset_password import create_reset_password_token
+from conftest import PASSWORD, auth, login
+
+
+def can_read(client, user: dict, access_token: str) -> bool:
+    return client.get(f"/api/v1/users/{user['user_id']}", headers=auth(access_token)).status_code == 200
+
+
+def test_refresh_rotates_the_refresh_token(client, make_user):
+    user = make_user()
+    response = client.post("/token/refresh", json={"refresh_token": user["refresh_token"]})
+    assert response.status_code == 200
+    rotated = response.json()
+    assert rotated["refresh_token"] != user["refresh_token"]
+    assert can_read(client, user, rotated["access_token"])
+
+
+def test_replayed_refresh_token_revokes_the_family(client, make_user):
+    user = make_user()
+    rotated = client.post("/token/refresh", json={"refresh_token": user["refresh_token"]}).json()
+
+    assert client.post("/token/refresh", json={"refresh_token": user["refresh_token"]}).status_code == 401
+    # The legitimate holder's newer tokens die with the family
+    assert client.post("/token/refresh", json={"refresh_token": rotated["refresh_token"]}).status_code == 401
+    assert not can_read(client, user, rotated["access_token"])
+    assert not can_read(client, user, user["access_token"])
+
+
+def test_revoke_ends_the_session(client, make_user):
+    user = make_user()
+    assert client.post("/token/revoke", json={"refresh_token": user["refresh_token"]}).status_code == 204
+    assert not can_read(client, user, user["access_token"])
+    assert client.post("/token/refresh", json={"refresh_token": user["refresh_token"]}).status_code == 401
+
+
+def test_password_reset_revokes_every_session(client, make_user):
+    user = make_user()
+    other_session = login(client, user["username"])
+    updated = client.put("/api/v1/users", json={"email": user["email"]}, headers=auth(user["access_token"]))
+    assert updated.status_code == 200
+    tokens = [user["access_token"], other_session["access_token"], updated.json()["access_token"]]
+    assert all(can_read(client, user, token) for token in tokens)
+
+    reset_token = create_reset_password_token({"user_id": user["user_id"]}, timedelta(minutes=5))
+    response = client.post("/api/v1/users/reset-password", json={"token": reset_token, "new_password": PASSWORD})
+    assert response.status_code == 200
+    assert not any(can_read(client, user, token) for token in tokens)
+    assert client.post("/token/refresh", json={"refresh_token": other_session["refresh_token"]}).status_code == 401
+
+
+def test_deleting_a_user_revokes_their_sessions(client, make_user):
+    admin = make_user(roles="admin")
+    user = make_user(roles="service")
+    updated = client.put("/api/v1/users", json={"email": user["email"]}, headers=auth(user["access_token"])).json()
+
+    assert client.delete(f"/api/v1/users/{user['user_id']}", headers=auth(admin["access_token"])).status_code == 200
+    # Listing authorizes from the token alone, so only revocation stops a deleted user here
+    for token in (user["access_token"], updated["access_token"]):
+        assert client.get("/api/v1/users/", headers=auth(token)).status_code == 401
+    assert client.post("/token/refresh", json={"refresh_token": user["refresh_token"]}).status_code == 401
@@ -0,0 +1,77 @@
+from app.auth.password import build_password_context
+from conftest import PASSWORD, auth, call_users_repo, login
+
+
+def test_duplicate_email_or_username_is_a_conflict(client, make_user):
+    user = make_user()
+    duplicates = [
+        {"email": user["email"].upper(), "username": user["username"] + "-other", "password": PASSWORD},
+        {"email": "other-" + user["email"], "username": user["username"].upper(), "password": PASSWORD},
+    ]
+    responses = [client.post("/api/v1/users/", json=duplicate) for duplicate in duplicates]
+    assert [response.status_code for response in responses] == [409, 409]
+    assert "email" in responses[0].json()["detail"]
+    assert "username" in responses[1].json()["detail"]
+
+
+def test_updating_to_a_taken_username_is_a_conflict(client, make_user):
+    user, other = make_user(), make_user()
+    response = client.put("/api/v1/users", json={"username": other["username"]}, headers=auth(user["access_token"]))
+    assert response.status_code == 409
+    assert "username" in response.json()["detail"]
+
+
+
+def test_bulk_create_reports_conflicts_per_row(client, make_user):
+    admin, existing = make_user(roles="admin"), make_user()
+    users = [
+        {"email": "bulk-new@test.local", "username": "bulk-new", "password": PASSWORD},
+        {"email": existing["email"], "username": "bulk-other", "password": PASSWORD},
+        {"email": "bulk-other@test.local", "username": existing["username"].upper(), "password": PASSWORD},
+        {"email": "BULK-NEW@test.local", "username": "bulk-again", "password": PASSWORD},
+    ]
+    response = client.post("/api/v1/users/bulk", json={"users": users}, headers=auth(admin["access_token"]))
+    assert response.status_code == 200
+    result = response.json()
+    assert [user["username"] for user in result["created"]] == ["bulk-new"]
+    assert [(error["index"], error["reason"]) for error in result["errors"]] == [
+        (1, "email already exists"),
+        (2, "username already exists"),
+        (3, "duplicate email in request"),
+    ]
+
+
+def test_password_hash_update_without_returning(client, make_user):
+    user = make_user()
+    # The UPDATE has no RETURNING clause, so there is no row to fetch
+    call_users_repo(client, "update_password_hash", user["user_id"], build_password_context(5).hash(PASSWORD))
+    login(client, user["username"])
+
+
+def test_keyset_pages_cover_every_user_once(client, make_user):
+    reader = make_user(roles="service")
+    created = [make_user()["user_id"] for _ in range(5)]
+
+    seen, after = [], reader["user_id"]
+    while True:
+        response = client.get("/api/v1/users/", params={"after": after, "limit": 2}, headers=auth(reader["access_token"]))
+        assert response.status_code == 200
+        page = [user["user_id"] for user in response.json()]
+        seen.extend(page)
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            assert len(page) < 2
+            break
+        assert int(cursor) == page[-1]
+        after = cursor
+
+    assert seen == sorted(set(seen))
+    assert set(created) <= set(seen)
+
+
+def test_cursor_header_is_readable_cross_origin(client, make_user):
+    reader = make_user(roles="service")
+    headers = {**auth(reader["access_token"]), "Origin": "https://app.example"}
+    response = client.get("/api/v1/users/", params={"limit": 1}, headers=headers)
+    assert response.headers["X-Next-Cursor"]
+    assert "x-next-cursor" in response.headers["Access-Control-Expose-Headers"].lower()